@@ -0,0 +1,148 @@
+import threading
+import time
+
+CLASS_AUTOCOMPLETE = 'autocomplete'
+CLASS_PAGES = 'pages'
+CLASS_CHECKIN = 'checkin'
+
+# endpoints without a class are never limited
+ENDPOINT_CLASSES = {
+    'location.autocomplete': CLASS_AUTOCOMPLETE,
+    'location.index': CLASS_PAGES,
+    'location.get': CLASS_PAGES,
+    'analytics.get': CLASS_PAGES,
+    'analytics.batch': CLASS_PAGES,
+    'tiles.get': CLASS_PAGES,
+    'location.create': CLASS_CHECKIN,
+}
+
+# limit: requests of the class running at once
+# share: fraction of the total capacity the class may fill, lower shares
+#     are shed first once the app gets busy
+# deadline: seconds a request may spend queued, upstream and in process
+# retry_after: seconds shed clients are asked to wait
+DEFAULT_CLASSES = {
+    CLASS_AUTOCOMPLETE: {
+        'limit': 4, 'share': 0.5, 'deadline': 0.25, 'retry_after': 1},
+    CLASS_PAGES: {
+        'limit': 8, 'share': 0.8, 'deadline': 1, 'retry_after': 2},
+    CLASS_CHECKIN: {
+        'limit': 8, 'share': 1.0, 'deadline': 5, 'retry_after': 5},
+}
+
+
+class AdmissionController(object):
+    """ Bounds how many requests of each class run at once.
+
+    A request waits for a slot until its class deadline passes and is shed
+    afterwards.  Time spent queued in front of the app (as reported by the
+    proxy in X-Request-Start) counts against the same deadline, so requests
+    that already waited too long are shed without waiting again.
+
+    Limits only mean something when a process serves requests concurrently,
+    i.e. under a threaded gunicorn worker (see gunicorn_config.py) with at
+    least `capacity` threads.
+    """
+
+    def __init__(self, capacity=16, classes=None):
+        """
+        Arguments:
+            capacity: Total requests running at once across all classes.
+            classes: Mapping of class name to its limit, share, deadline
+                and retry_after.  Defaults to `DEFAULT_CLASSES`.
+        """
+        self.capacity = capacity
+        self.classes = classes or DEFAULT_CLASSES
+        self._cond = threading.Condition()
+        self._total = 0
+        self._stats = {
+            name: {
+                'in_flight': 0,
+                'admitted': 0,
+                'shed': 0,
+                'queue_time_total': 0.0,
+                'queue_time_max': 0.0,
+            } for name in self.classes
+        }
+
+    @staticmethod
+    def upstream_queue_time(header, now=None):
+        """ Returns the seconds a request spent queued before reaching the
+        app according to an X-Request-Start header (`t=<timestamp>` in
+        seconds, milliseconds or microseconds), or 0 if unknown.
+        """
+        if not header:
+            return 0
+        try:
+            started = float(header.strip().replace('t=', ''))
+        except ValueError:
+            return 0
+
+        if started > 1e14:
+            started /= 1e6
+        elif started > 1e11:
+            started /= 1e3
+        return max((now or time.time()) - started, 0)
+
+    def _has_room(self, name):
+        config = self.classes[name]
+        if self._stats[name]['in_flight'] >= config['limit']:
+            return False
+        return self._total < self.capacity * config['share']
+
+    def acquire(self, name, queued=0):
+        """ Waits for a slot of class `name`.
+        Arguments:
+            name: Class of the request.
+            queued: Seconds the request was already queued upstream.
+        Returns:
+            True if the request was admitted and has to `release` its slot,
+            False if it was shed.
+        """
+        started = time.time()
+        deadline = started + self.classes[name]['deadline'] - queued
+        stats = self._stats[name]
+
+        with self._cond:
+            while not self._has_room(name):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    stats['shed'] += 1
+                    return False
+                self._cond.wait(remaining)
+
+            if deadline < time.time():
+                stats['shed'] += 1
+                return False
+
+            waited = queued + time.time() - started
+            self._total += 1
+            stats['in_flight'] += 1
+            stats['admitted'] += 1
+            stats['queue_time_total'] += waited
+            stats['queue_time_max'] = max(stats['queue_time_max'], waited)
+            return True
+
+    def release(self, name):
+        with self._cond:
+            self._total -= 1
+            self._stats[name]['in_flight'] -= 1
+            self._cond.notify_all()
+
+    def retry_after(self, name):
+        return self.classes[name]['retry_after']
+
+    def stats(self):
+        with self._cond:
+            result = {'capacity': self.capacity, 'in_flight': self._total}
+            for name, stats in self._stats.iteritems():
+                result[name] = {
+                    'in_flight': stats['in_flight'],
+                    'admitted': stats['admitted'],
+                    'shed': stats['shed'],
+                    'queue_time_avg': (
+                        stats['queue_time_total'] / stats['admitted']
+                        if stats['admitted'] else 0),
+                    'queue_time_max': stats['queue_time_max'],
+                }
+            return result
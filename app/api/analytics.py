@@ -0,0 +1,40 @@
+from flask import Blueprint, jsonify, request, current_app
+from lib.analytics.trajectory import summarize, summarize_many, track_arrays
+from lib import errors
+
+
+analytics = Blueprint('analytics', __name__)
+
+# users per batch request
+MAX_BATCH = 100
+
+
+@analytics.route('', methods=['GET'])
+def batch():
+    usernames = list(set(request.args.getlist('username')))
+    if not usernames or len(usernames) > MAX_BATCH:
+        return jsonify({
+            'error': 'pass between 1 and %d username arguments' % MAX_BATCH,
+            'url': request.host_url
+        }), 400
+
+    location_db = current_app.extensions['registry']['DB_LOCATION']
+    tracks = location_db.get_tracks(usernames)
+    summaries = summarize_many({
+        username: track_arrays(rows)
+        for username, rows in tracks.iteritems() if rows
+    })
+
+    return jsonify({'users': summaries})
+
+
+@analytics.route('/<username>', methods=['GET'])
+def get(username):
+    location_db = current_app.extensions['registry']['DB_LOCATION']
+    rows = location_db.get_track(username)
+    if not rows:
+        raise errors.ResourceNotFound('no check-ins for %s' % username)
+
+    summary = summarize(*track_arrays(rows))
+    summary['username'] = username
+    return jsonify(summary)
@@ -1,10 +1,10 @@
 from flask import (
-    Blueprint, jsonify, request, render_template, current_app, redirect)
+    Blueprint, jsonify, request, render_template, current_app, redirect,
+    url_for)
 from lib.models import Location
 from lib.forms import LocationForm
 from lib import errors
 import arrow
-import requests
 
 
 location = Blueprint('location', __name__)
@@ -17,9 +17,31 @@ def create():
     if not form.validate():
         return render_template('new.html', form=form), 400
 
+    if current_app.config['ASYNC_CHECKINS']:
+        return _accept(form, data)
+
     location_db = current_app.extensions['registry']['DB_LOCATION']
+    geonames = current_app.extensions['registry']['GEONAMES_CLIENT']
+
+    # a picked suggestion already carries its coordinates, only fall back
+    # to searching by name when there is no usable token
+    try:
+        location_data = geonames.geocode(
+            form.location_name.data, form.suggestion_token.data)
+    except errors.GeocodingUnavailable as e:
+        if current_app.config['QUEUE_UNGEOCODED_CHECKINS']:
+            # geocode it later rather than losing the check-in
+            return _accept(form, data)
+
+        form.location_name.errors = [
+            'location lookup is unavailable right now, pick one of the '
+            'suggestions or try again later']
+        response = current_app.make_response(
+            (render_template('new.html', form=form), 503))
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
 
-    location_data = search_location(form.location_name.data)
     if not location_data:
         form.location_name.errors = ['no location found by that name']
         return render_template('new.html', form=form), 400
@@ -28,8 +50,8 @@ def create():
         'location_name': form.location_name.data,
         'timestamp_created': (
             data.get('timestamp_created') or arrow.utcnow().datetime),
-        'latitude': float(location_data[0]['lat']),
-        'longitude': float(location_data[0]['lng'])
+        'latitude': float(location_data['lat']),
+        'longitude': float(location_data['lng'])
     })
 
     location_db.create(location)
@@ -37,24 +59,58 @@ def create():
     return redirect('')
 
 
-@location.route('autocomplete', methods=['GET'])
-def autocomplete():
-    location_options = get_suggestions(request.args['value'], request.args['order'])
-    return jsonify({"locations": location_options})
+def _accept(form, data):
+    """ Queues a validated check-in for the background workers and
+    responds without waiting on geocoding or cassandra.
+    """
+    registry = current_app.extensions['registry']
+    payload = {
+        'username': form.username.data,
+        'location_name': form.location_name.data,
+        'timestamp_created': (
+            data.get('timestamp_created') or arrow.utcnow().isoformat()),
+    }
+
+    # resolved now, the worker may only get to it long after
+    place = registry['GEONAMES_CLIENT'].resolve_suggestion(
+        form.suggestion_token.data, form.location_name.data)
+    if place:
+        payload['latitude'] = float(place['lat'])
+        payload['longitude'] = float(place['lng'])
 
+    checkin_id = registry['CHECKIN_QUEUE'].enqueue(payload)
+    registry['CHECKIN_WORKERS'].notify()
 
-def search_location(location_name):
-    url = ("http://api.geonames.org/searchJSON?username=dimagi&maxRows=1&name=%s"
-           % location_name)
-    response = requests.get(url)
-    return response.json()['geonames']
+    status_url = url_for('location.checkin_status', checkin_id=checkin_id)
+    if request.accept_mimetypes.best == 'application/json':
+        response = jsonify({
+            'id': checkin_id,
+            'status': 'pending',
+            'status_url': status_url,
+        })
+        response.status_code = 202
+        response.headers['Location'] = status_url
+        return response
 
+    return render_template('queued.html', status_url=status_url), 202
 
-def get_suggestions(location_name, orderby):
-    url = ("http://api.geonames.org/searchJSON?username=dimagi&name=%s&maxRows=10&orderby=%s"
-        % (location_name, orderby))
-    response = requests.get(url)
-    return response.json()['geonames']
+
+@location.route('checkins/<checkin_id>', methods=['GET'])
+def checkin_status(checkin_id):
+    checkin_queue = current_app.extensions['registry']['CHECKIN_QUEUE']
+    status = checkin_queue.get(checkin_id)
+    if not status:
+        raise errors.ResourceNotFound('no check-in with id %s' % checkin_id)
+
+    return jsonify(status)
+
+
+@location.route('autocomplete', methods=['GET'])
+def autocomplete():
+    geonames = current_app.extensions['registry']['GEONAMES_CLIENT']
+    location_options = geonames.suggest(
+        request.args['value'], request.args['order'])
+    return jsonify({"locations": location_options})
 
 
 @location.route('new', methods=['GET'])
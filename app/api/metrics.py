@@ -0,0 +1,13 @@
+from flask import Blueprint, jsonify, current_app
+
+
+metrics = Blueprint('metrics', __name__)
+
+
+@metrics.route('', methods=['GET'])
+def index():
+    registry = current_app.extensions['registry']
+    return jsonify({
+        'checkin_queue': registry['CHECKIN_QUEUE'].stats(),
+        'admission': registry['ADMISSION_CONTROLLER'].stats(),
+    })
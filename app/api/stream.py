@@ -0,0 +1,64 @@
+from flask import Blueprint, jsonify, request, current_app, Response
+
+
+stream = Blueprint('stream', __name__)
+
+# seconds between keepalive comments on an idle event stream
+HEARTBEAT = 15
+
+
+@stream.route('', methods=['GET'])
+def index():
+    """ Server-sent events stream of new check-ins, optionally limited to a
+    single `username`.
+
+    Every event carries its id.  A client reconnecting with the last id it
+    saw (the Last-Event-ID header browsers send on their own, or a
+    `last_event_id` argument) first gets the check-ins it missed.  If those
+    are no longer known it is sent a `reset` event instead, telling it to
+    reload what it shows.  Clients that fall behind are sent a `dropped`
+    event and disconnected.
+    """
+    broadcaster = current_app.extensions['registry']['LOCATION_BROADCASTER']
+    last_id = _last_event_id()
+    subscription = broadcaster.subscribe(
+        request.args.get('username'), last_id)
+
+    def events():
+        yield 'retry: 2000\n\n'
+        if subscription.gap:
+            yield 'event: reset\ndata: {}\n\n'
+        while True:
+            event = subscription.get(timeout=HEARTBEAT)
+            if event is not None:
+                yield 'id: %d\nevent: checkin\ndata: %s\n\n' % event
+            elif subscription.dropped:
+                yield 'event: dropped\ndata: {}\n\n'
+                return
+            elif subscription.closed:
+                return
+            else:
+                yield ': keepalive\n\n'
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # also runs for clients that disconnect before the first event
+    response.call_on_close(lambda: broadcaster.unsubscribe(subscription))
+    return response
+
+
+@stream.route('/metrics', methods=['GET'])
+def metrics():
+    registry = current_app.extensions['registry']
+    return jsonify(registry['LOCATION_BROADCASTER'].stats())
+
+
+def _last_event_id():
+    value = (request.headers.get('Last-Event-ID') or
+             request.args.get('last_event_id'))
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify, current_app
+from lib.analytics.heatmap import TILE_BINS
+from lib import errors
+
+
+tiles = Blueprint('tiles', __name__)
+
+# seconds browsers may reuse a tile
+TILE_MAX_AGE = 60
+
+
+@tiles.route('/<int:zoom>/<int:x>/<int:y>', methods=['GET'])
+def get(zoom, x, y):
+    heatmap_db = current_app.extensions['registry']['DB_HEATMAP']
+    if not heatmap_db.valid_tile(zoom, x, y):
+        raise errors.ResourceNotFound(
+            'no tile %d/%d/%d' % (zoom, x, y))
+
+    tile = heatmap_db.get_tile(zoom, x, y)
+    response = jsonify({
+        'zoom': zoom,
+        'x': x,
+        'y': y,
+        'bins': TILE_BINS,
+        # sparse [bin, count] pairs, bin = row * bins + column
+        'counts': sorted([b, count] for b, count in tile.iteritems()),
+    })
+    response.headers['Cache-Control'] = 'public, max-age=%d' % TILE_MAX_AGE
+    return response
@@ -1,17 +1,54 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_registry import Registry
 import logging
-from lib.errors import ResourceNotFound, AuthenticationError
+import os
+import tempfile
+from lib.errors import (
+    ResourceNotFound, AuthenticationError, GeocodingUnavailable)
 import traceback
 import wtforms_json
 from lib.clients.cass import SimpleClient
+from lib.clients.geonames import GeoNamesClient
+from lib.checkin_queue import CheckinQueue
+from lib.checkin_workers import CheckinWorkerPool
+from lib.event_log import EventLog
+from lib.quota import QuotaLimiter
 import sys
 
+DEFAULT_CONFIG = {
+    # shared by every worker on the host so they draw from one budget
+    'GEONAMES_QUOTA_PATH': os.path.join(
+        tempfile.gettempdir(), 'dimagi_geonames_quota.sqlite'),
+    # signs autocomplete suggestion tokens, has to be the same on every host
+    # serving the app.  Only debug and testing runs may leave it unset, they
+    # get a key generated into the instance folder
+    'SECRET_KEY': None,
+    # accept check-ins into the queue and geocode them in the background
+    'ASYNC_CHECKINS': False,
+    # defaults to the instance folder, keep it off tmpfs and out of reach
+    # of temp directory cleanup so accepted check-ins survive reboots
+    'CHECKIN_QUEUE_PATH': None,
+    # queue check-ins GeoNames cannot geocode right now instead of turning
+    # them away, when not running with ASYNC_CHECKINS
+    'QUEUE_UNGEOCODED_CHECKINS': False,
+    # background workers per process while the queue is used, 0 leaves the
+    # queue to other processes
+    'CHECKIN_WORKERS': 2,
+    # requests handled at once per process before classes start shedding
+    'ADMISSION_CAPACITY': 16,
+    # new check-ins for the event stream, defaults to the instance folder.
+    # the stream app has to run on the same host and read the same file
+    'LOCATION_EVENTS_PATH': None,
+}
 
-def _initialize_flask_app():
+
+def _initialize_flask_app(config=None):
     app = Flask(
         __name__
     )
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_envvar('DIMAGI_SETTINGS', silent=True)
+    app.config.update(config or {})
 
     return app
 
@@ -20,6 +57,15 @@ def _register_blueprints(app):
     from api.location import location
     app.register_blueprint(location, url_prefix='/')
 
+    from api.metrics import metrics
+    app.register_blueprint(metrics, url_prefix='/metrics')
+
+    from api.analytics import analytics
+    app.register_blueprint(analytics, url_prefix='/analytics')
+
+    from api.tiles import tiles
+    app.register_blueprint(tiles, url_prefix='/tiles')
+
     return app
 
 
@@ -38,10 +84,83 @@ def _initialize_registry(app):
     reg = Registry(app=app)
 
     reg['CASSANDRA_CLIENT'] = _initialize_client(SimpleClient)
+    reg['GEONAMES_CLIENT'] = GeoNamesClient(
+        _secret_key(app),
+        limiter=QuotaLimiter(app.config['GEONAMES_QUOTA_PATH']))
+    reg['CHECKIN_QUEUE'] = CheckinQueue(
+        app.config['CHECKIN_QUEUE_PATH'] or
+        os.path.join(_data_dir(app), 'checkins.sqlite'))
+    reg['CHECKIN_WORKERS'] = CheckinWorkerPool(
+        app, reg['CHECKIN_QUEUE'], size=app.config['CHECKIN_WORKERS'])
+
+    from admission import AdmissionController
+    reg['ADMISSION_CONTROLLER'] = AdmissionController(
+        capacity=app.config['ADMISSION_CAPACITY'])
+
+    reg['LOCATION_EVENTS'] = _event_log(app)
 
     from lib.repositories.location import LocationRepo
     reg['DB_LOCATION'] = LocationRepo()
 
+    from lib.repositories.heatmap import HeatmapRepo
+    reg['DB_HEATMAP'] = HeatmapRepo()
+
+
+def _data_dir(app):
+    """ Returns the instance folder of the app, created private to the user
+    running it.  Files kept there cannot be planted or read by other local
+    users, unlike ones in the shared temp directory.
+    """
+    path = app.instance_path
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path, 0o700)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        raise RuntimeError(
+            '%s has to be owned by the user running the app and not be '
+            'accessible to anyone else' % path)
+    return path
+
+
+def _event_log(app):
+    return EventLog(
+        app.config['LOCATION_EVENTS_PATH'] or
+        os.path.join(_data_dir(app), 'events.sqlite'))
+
+
+def _secret_key(app):
+    if app.config['SECRET_KEY']:
+        return str(app.config['SECRET_KEY'])
+
+    if not (app.debug or app.testing):
+        raise RuntimeError(
+            'SECRET_KEY is not configured.  Set it in DIMAGI_SETTINGS to '
+            'the same value on every host serving the app')
+
+    path = os.path.join(_data_dir(app), 'secret_key')
+    if not os.path.exists(path):
+        # linking a finished file into place keeps workers starting at the
+        # same time from reading a half written key or from each keeping
+        # their own
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            os.write(fd, os.urandom(32).encode('hex'))
+            os.close(fd)
+            os.link(tmp_path, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+        finally:
+            os.unlink(tmp_path)
+
+    with open(path) as f:
+        return f.read().strip()
+
 
 def _initialize_client(client):
     _client_logger = logging.getLogger('cassandra_client')
@@ -60,13 +179,64 @@ def _initialize_client(client):
     return client.instance
 
 
-def create_app():
-    app = _initialize_flask_app()
+def create_app(config=None):
+    app = _initialize_flask_app(config)
     _initialize_registry(app)
     app = _configure_logging(app)
     app = _initialize_wtforms_json(app)
     app = _register_blueprints(app)
+    app = _register_admission_control(app)
     app = _register_error_handlers(app)
+    app = _start_checkin_workers(app)
+    return app
+
+
+def _start_checkin_workers(app):
+    if not (app.config['ASYNC_CHECKINS'] or
+            app.config['QUEUE_UNGEOCODED_CHECKINS']):
+        return app
+
+    # threads do not survive a fork, so this has to run in the worker
+    # process itself rather than in a preloading master
+    app.extensions['registry']['CHECKIN_WORKERS'].start()
+    return app
+
+
+def _register_admission_control(app):
+    from admission import ENDPOINT_CLASSES
+    controller = app.extensions['registry']['ADMISSION_CONTROLLER']
+    warned = []
+
+    @app.before_request
+    def admit():
+        name = ENDPOINT_CLASSES.get(request.endpoint)
+        if not name:
+            return None
+
+        if not request.environ.get('wsgi.multithread') and not warned:
+            warned.append(True)
+            app.logger.warning(
+                'requests are not served concurrently, admission limits '
+                'have no effect.  Run gunicorn with gunicorn_config.py')
+
+        queued = controller.upstream_queue_time(
+            request.headers.get('X-Request-Start'))
+        if not controller.acquire(name, queued):
+            response = jsonify({'error': 'server is busy',
+                                'url': request.host_url})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(
+                controller.retry_after(name))
+            return response
+
+        g.admission_class = name
+
+    @app.teardown_request
+    def release(exc):
+        name = getattr(g, 'admission_class', None)
+        if name:
+            controller.release(name)
+
     return app
 
 
@@ -79,6 +249,14 @@ def _register_error_handlers(app):
     def handle_resource_not_found_error(error):
         return jsonify({'error': error.message, 'url': request.host_url}), 404
 
+    @app.errorhandler(GeocodingUnavailable)
+    def handle_geocoding_unavailable(error):
+        response = jsonify({'error': error.message, 'url': request.host_url})
+        response.status_code = 503
+        if error.retry_after:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
     @app.errorhandler(Exception)
     def handle_error(e):
         exc_info = sys.exc_info()
@@ -0,0 +1,42 @@
+from flask_registry import Registry
+from lib.broadcast import Broadcaster
+from lib.event_log import EventRelay
+from dimagi_challenge_app import (
+    _configure_logging, _event_log, _initialize_flask_app)
+
+
+def _initialize_registry(app):
+    reg = Registry(app=app)
+
+    reg['LOCATION_BROADCASTER'] = Broadcaster()
+    reg['EVENT_RELAY'] = EventRelay(
+        _event_log(app), reg['LOCATION_BROADCASTER'])
+
+
+def _register_blueprints(app):
+    from api.stream import stream
+    app.register_blueprint(stream, url_prefix='/stream')
+
+    return app
+
+
+def _start_event_relay(app):
+    # like the check-in workers, has to start in the worker process itself
+    app.extensions['registry']['EVENT_RELAY'].start()
+    return app
+
+
+def create_stream_app(config=None):
+    """ App serving only the check-in event stream.
+
+    Open streams sit idle most of the time, so they are served apart from
+    the main app by a gevent worker (see gunicorn_stream_config.py), where
+    an idle connection costs a greenlet rather than a thread.  Check-ins
+    reach it through the event log the main app appends to.
+    """
+    app = _initialize_flask_app(config)
+    _initialize_registry(app)
+    app = _configure_logging(app)
+    app = _register_blueprints(app)
+    app = _start_event_relay(app)
+    return app
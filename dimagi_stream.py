@@ -0,0 +1,15 @@
+import os
+import sys
+
+_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(_root)
+
+from app.stream_app import create_stream_app
+
+
+if __name__ == '__main__':
+    print "== Running in debug mode =="
+    application = create_stream_app({'DEBUG': True})
+    application.run(host='0.0.0.0', port=8073, threaded=True)
+else:
+    application = create_stream_app()
@@ -0,0 +1 @@
+from fabfile.tasks import rebuild_heatmap  # noqa
@@ -0,0 +1,15 @@
+from fabric.api import task
+
+
+@task
+def rebuild_heatmap(parallelism=8):
+    """ Recomputes the heatmap tiles from every stored check-in. """
+    from app.dimagi_challenge_app import create_app
+
+    # no background check-in processing while the counters are rebuilt
+    app = create_app({'CHECKIN_WORKERS': 0})
+    with app.app_context():
+        registry = app.extensions['registry']
+        locations = registry['DB_LOCATION'].scan(
+            'location_by_timestamp', parallelism=int(parallelism))
+        registry['DB_HEATMAP'].rebuild(locations)
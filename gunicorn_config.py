@@ -0,0 +1,18 @@
+# gunicorn -c gunicorn_config.py dimagi_app:application
+#
+# Admission control relies on a process serving several requests at once.
+# The default sync worker handles one request at a time, so limits would
+# never trigger.  The event stream is served by its own app, see
+# gunicorn_stream_config.py.
+worker_class = 'gthread'
+
+# ADMISSION_CAPACITY
+threads = 16
+
+bind = '0.0.0.0:8072'
+
+
+def post_fork(server, worker):
+    # the analytics pool has to be forked before the app starts threads
+    from lib.analytics.trajectory import start_pool
+    start_pool()
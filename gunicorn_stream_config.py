@@ -0,0 +1,11 @@
+# gunicorn -c gunicorn_stream_config.py dimagi_stream:application
+#
+# Serves the check-in event stream.  Streams stay open and idle for as long
+# as clients are connected, so the worker is gevent, where each of them only
+# costs a greenlet instead of a thread.
+worker_class = 'gevent'
+
+# open streams per process
+worker_connections = 10000
+
+bind = '0.0.0.0:8073'
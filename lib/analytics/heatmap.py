@@ -0,0 +1,56 @@
+import numpy as np
+
+# tiles are precomputed for zoom levels 0 through MAX_ZOOM
+MAX_ZOOM = 12
+
+# every tile is split into TILE_BINS x TILE_BINS bins
+TILE_BINS = 32
+
+# web mercator does not reach the poles
+MAX_LATITUDE = 85.05112878
+
+
+def bin_coordinates(latitudes, longitudes, zoom, bins=TILE_BINS):
+    """ Places coordinates on the web mercator tile grid of a zoom level.
+    Returns:
+        tuple of arrays holding the tile x, tile y and the bin within the
+        tile (row * bins + column) of every coordinate.
+    """
+    size = (2 ** zoom) * bins
+    latitudes = np.radians(np.clip(latitudes, -MAX_LATITUDE, MAX_LATITUDE))
+
+    column = (np.asarray(longitudes) + 180.0) / 360.0 * size
+    row = (1 - np.log(np.tan(latitudes) + 1 / np.cos(latitudes)) / np.pi) \
+        / 2 * size
+    column = np.clip(np.floor(column).astype(np.int64), 0, size - 1)
+    row = np.clip(np.floor(row).astype(np.int64), 0, size - 1)
+
+    return column // bins, row // bins, (row % bins) * bins + column % bins
+
+
+def aggregate(latitudes, longitudes, zooms=None, bins=TILE_BINS):
+    """ Counts coordinates per tile bin for every zoom level.
+    Returns:
+        dict of (zoom, x, y) to a dict of bin to count.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    known = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    latitudes, longitudes = latitudes[known], longitudes[known]
+
+    tiles = {}
+    for zoom in (zooms if zooms is not None else xrange(MAX_ZOOM + 1)):
+        x, y, b = bin_coordinates(latitudes, longitudes, zoom, bins)
+
+        # fold tile and bin into one key so a single unique call counts them
+        side = 2 ** zoom
+        keys = (x * side + y) * (bins * bins) + b
+        keys, counts = np.unique(keys, return_counts=True)
+
+        tile, b = np.divmod(keys, bins * bins)
+        x, y = np.divmod(tile, side)
+        for tx, ty, tb, count in zip(x.tolist(), y.tolist(), b.tolist(),
+                                     counts.tolist()):
+            tiles.setdefault((zoom, tx, ty), {})[tb] = count
+
+    return tiles
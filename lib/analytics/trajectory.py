@@ -0,0 +1,116 @@
+import multiprocessing
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# faster than a commercial flight between two check-ins is not plausible
+IMPOSSIBLE_SPEED_KMH = 1000.0
+
+# batches smaller than this are not worth shipping to the process pool
+POOL_THRESHOLD = 50
+
+_pool = None
+
+
+def track_arrays(rows):
+    """ Converts `location_by_timestamp` rows, ordered by timestamp, into
+    arrays of epoch seconds, latitudes, longitudes and location names.
+    """
+    timestamps = np.array([row.timestamp_created for row in rows],
+                          dtype='datetime64[ms]')
+    return (
+        timestamps.astype(np.int64) / 1000.0,
+        np.array([row.latitude for row in rows], dtype=np.float64),
+        np.array([row.longitude for row in rows], dtype=np.float64),
+        np.array([row.location_name or u'' for row in rows], dtype=np.unicode_),
+    )
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """ Great circle distance in km between arrays of coordinates. """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2 +
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def summarize(timestamps, latitudes, longitudes, names,
+              impossible_speed=IMPOSSIBLE_SPEED_KMH):
+    """ Computes trajectory metrics of one user.
+    Arguments:
+        timestamps: Epoch seconds of the check-ins in ascending order.
+        latitudes: Latitudes of the check-ins.
+        longitudes: Longitudes of the check-ins.
+        names: Location names of the check-ins.
+        impossible_speed: Speed in km/h above which travelling between two
+            consecutive check-ins is flagged as impossible.
+    Returns:
+        dict with the total distance, the speed of every leg between
+        consecutive check-ins, dwell seconds per place and the legs that
+        were travelled impossibly fast.  The dwell time of a check-in lasts
+        until the next one, so the latest check-in does not count.
+    """
+    distances = haversine(latitudes[:-1], longitudes[:-1],
+                          latitudes[1:], longitudes[1:])
+    hours = np.diff(timestamps) / 3600.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speeds = np.where(hours > 0, distances / hours,
+                          np.where(distances > 0, np.inf, 0.0))
+    impossible = np.flatnonzero(speeds > impossible_speed)
+    finite_speeds = speeds[np.isfinite(speeds)]
+
+    places, place_index = np.unique(names[:-1], return_inverse=True)
+    dwell = np.bincount(place_index, weights=hours * 3600.0)
+
+    return {
+        'checkins': len(timestamps),
+        'total_distance_km': float(distances.sum()),
+        # json has no infinity, legs without elapsed time have no speed
+        'speeds_kmh': [
+            float(s) if np.isfinite(s) else None for s in speeds],
+        'max_speed_kmh': (
+            float(finite_speeds.max()) if len(finite_speeds) else None),
+        'dwell_seconds': {
+            place: float(seconds) for place, seconds in zip(places, dwell)},
+        'impossible_travel': bool(len(impossible)),
+        'impossible_legs': impossible.tolist(),
+    }
+
+
+def _summarize_track(track):
+    return summarize(*track)
+
+
+def start_pool(processes=2):
+    """ Starts the process pool large batches are summarized with.
+
+    Forking a process that already runs threads can leave the children
+    holding locks nobody will release, so this has to be called before any
+    thread starts, e.g. from gunicorn's post_fork hook.  For the same
+    reason the children are kept for the life of the process rather than
+    recycled after some number of tasks.  Without a pool, every batch is
+    summarized in process.
+    """
+    global _pool
+    if _pool is None:
+        _pool = multiprocessing.Pool(processes)
+
+
+def summarize_many(tracks):
+    """ Summarizes the tracks of many users, fanning out to the process
+    pool of `start_pool` for large batches.
+    Arguments:
+        tracks: dict of username to the arrays returned by `track_arrays`.
+    Returns:
+        dict of username to the result of `summarize`.
+    """
+    usernames = list(tracks)
+    arrays = [tracks[username] for username in usernames]
+    if _pool is None or len(arrays) < POOL_THRESHOLD:
+        results = map(_summarize_track, arrays)
+    else:
+        results = _pool.map(_summarize_track, arrays)
+    return dict(zip(usernames, results))
@@ -0,0 +1,161 @@
+from collections import deque
+import threading
+
+
+class Subscription(object):
+    """ Bounded buffer of (event id, event) pairs for a single subscriber.
+    A subscriber that lets its buffer fill up is dropped instead of slowing
+    down publishers.
+    """
+
+    def __init__(self, key, maxsize):
+        self.key = key
+        self.maxsize = maxsize
+        self.dropped = False
+        self.closed = False
+        # events the subscriber asked to catch up on were no longer known
+        self.gap = False
+        self._events = deque()
+        self._cond = threading.Condition()
+
+    def offer(self, event):
+        """ Buffers an event.
+        Returns:
+            False if the subscription is closed, either because the buffer
+            was full and the subscriber got dropped or because it ended.
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._events) >= self.maxsize:
+                self.dropped = True
+                self.closed = True
+                self._cond.notify()
+                return False
+            self._events.append(event)
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """ Returns the next buffered event, or None if none arrived within
+        `timeout` seconds or the subscription was closed.
+        """
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            if self._events:
+                return self._events.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class Broadcaster(object):
+    """ In-process fan out of events to subscribers.
+
+    Subscribers either follow a single key (a username) or every key.
+    Publishing only touches the subscribers following the event's key plus
+    the catch-all ones, and idle subscribers hold nothing but an empty
+    buffer.  Events only reach subscribers of the same process.
+
+    The last `history` events are kept, so a subscriber that reconnects
+    with the id of the last event it saw is first handed what it missed.
+    """
+
+    def __init__(self, maxsize=100, history=1000):
+        """
+        Arguments:
+            maxsize: Events buffered per subscriber before it is dropped.
+            history: Events kept for subscribers catching up.
+        """
+        self.maxsize = maxsize
+        self.history = history
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._everything = set()
+        self._history = deque(maxlen=history)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, key=None, last_id=None):
+        """ Returns a `Subscription` for events published under `key`, or
+        for all events if no key is given.
+        Arguments:
+            last_id: Id of the last event the subscriber saw.  Later events
+                still in the history are buffered right away.  If some are
+                gone, the subscription is flagged with `gap`.
+        """
+        subscription = Subscription(key, self.maxsize)
+        with self._lock:
+            if last_id is not None:
+                self._replay(subscription, last_id)
+
+            # registered under the same lock publish holds while adding to
+            # the history, so no event is both replayed and offered or lost
+            # in between
+            if key is None:
+                self._everything.add(subscription)
+            else:
+                self._by_key.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def _replay(self, subscription, last_id):
+        if self._history and self._history[0][0] > last_id + 1:
+            subscription.gap = True
+            return
+
+        missed = [
+            (event_id, event) for event_id, key, event in self._history
+            if event_id > last_id and
+            (subscription.key is None or key == subscription.key)
+        ]
+        if len(missed) > subscription.maxsize:
+            subscription.gap = True
+            return
+        for event in missed:
+            subscription.offer(event)
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            if subscription.key is None:
+                subscribers = self._everything
+            else:
+                subscribers = self._by_key.get(subscription.key, set())
+
+            if subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if subscription.key is not None and not subscribers:
+                del self._by_key[subscription.key]
+            if subscription.dropped:
+                self.dropped += 1
+
+    def publish(self, key, event, event_id):
+        """ Hands `event` to every subscriber of `key` and to the catch-all
+        subscribers.  Subscribers with a full buffer are dropped.
+        Arguments:
+            event_id: Increasing id of the event, see `EventLog`.
+        """
+        with self._lock:
+            self._history.append((event_id, key, event))
+            subscribers = list(self._everything)
+            subscribers.extend(self._by_key.get(key, ()))
+            self.published += 1
+
+        for subscription in subscribers:
+            if not subscription.offer((event_id, event)):
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._everything) + sum(
+                    len(s) for s in self._by_key.itervalues()),
+                'published': self.published,
+                'dropped': self.dropped,
+                'history': len(self._history),
+            }
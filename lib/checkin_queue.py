@@ -0,0 +1,229 @@
+import json
+import sqlite3
+import time
+import uuid
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class CheckinQueue(object):
+    """ Durable queue of accepted check-ins waiting to be geocoded and
+    written to cassandra.
+
+    Backed by a sqlite file so queued check-ins survive restarts and every
+    worker process on the host shares the same queue.  Claimed check-ins
+    that are not finished within `visibility_timeout` are handed out again,
+    so processing is at-least-once.
+    """
+
+    def __init__(self, path, visibility_timeout=60, retention=24 * 60 * 60):
+        """
+        Arguments:
+            path: sqlite file holding the queue.
+            visibility_timeout: Seconds a claimed check-in may stay
+                unfinished before it is claimed again.
+            retention: Seconds finished check-ins are kept for status
+                lookups.
+        """
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.retention = retention
+        self._initialize()
+
+    def _connect(self):
+        # autocommit mode, transactions are started explicitly so that
+        # BEGIN IMMEDIATE serializes claims across processes
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _initialize(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkin (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    enqueued_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    claimed_at REAL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS checkin_ready
+                ON checkin (status, available_at)
+            """)
+        finally:
+            conn.close()
+
+    def enqueue(self, payload):
+        """ Adds a check-in to the queue.
+        Arguments:
+            payload: json serializable dict describing the check-in.
+        Returns:
+            id of the queued check-in.
+        """
+        checkin_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO checkin (id, payload, status, enqueued_at, "
+                "available_at) VALUES (?, ?, ?, ?, ?)",
+                (checkin_id, json.dumps(payload), STATUS_PENDING, now, now)
+            )
+        finally:
+            conn.close()
+        return checkin_id
+
+    def claim(self):
+        """ Claims the oldest check-in that is ready to be processed.
+        Returns:
+            tuple of (id, payload, attempts) or None if nothing is ready.
+        """
+        now = time.time()
+        ready = (
+            "SELECT id, payload, attempts FROM checkin "
+            "WHERE (status = ? AND available_at <= ?) "
+            "OR (status = ? AND claimed_at <= ?) "
+            "ORDER BY available_at LIMIT 1"
+        )
+        params = (STATUS_PENDING, now,
+                  STATUS_PROCESSING, now - self.visibility_timeout)
+        conn = self._connect()
+        try:
+            # idle workers poll all the time, so only take the write lock
+            # once a plain read saw something to claim
+            if not conn.execute(ready, params).fetchone():
+                return None
+
+            # closing the connection rolls back the transaction on errors
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(ready, params).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE checkin SET status = ?, claimed_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (STATUS_PROCESSING, now, row['id'])
+            )
+            conn.execute("COMMIT")
+            return row['id'], json.loads(row['payload']), row['attempts'] + 1
+        finally:
+            conn.close()
+
+    def complete(self, checkin_id):
+        self._finish(checkin_id, STATUS_DONE, None)
+
+    def fail(self, checkin_id, error):
+        """ Gives up on a check-in for good. """
+        self._finish(checkin_id, STATUS_FAILED, error)
+
+    def _finish(self, checkin_id, status, error):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE checkin SET status = ?, error = ?, finished_at = ? "
+                "WHERE id = ?",
+                (status, error, time.time(), checkin_id)
+            )
+        finally:
+            conn.close()
+
+    def retry(self, checkin_id, error, delay, count_attempt=True):
+        """ Puts a claimed check-in back to be claimed again after `delay`
+        seconds.
+        Arguments:
+            count_attempt: False hands back the attempt taken by `claim`,
+                for failures that are not the check-in's fault.
+        """
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE checkin SET status = ?, error = ?, available_at = ?, "
+                "claimed_at = NULL, attempts = attempts - ? WHERE id = ?",
+                (STATUS_PENDING, error, time.time() + delay,
+                 0 if count_attempt else 1, checkin_id)
+            )
+        finally:
+            conn.close()
+
+    def get(self, checkin_id):
+        """ Returns the status of a queued check-in as a dict, or None if
+        the id is unknown or has expired.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id, status, attempts, error, enqueued_at, finished_at "
+                "FROM checkin WHERE id = ?",
+                (checkin_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        return dict(zip(row.keys(), row))
+
+    def purge(self):
+        """ Drops finished check-ins older than the retention period. """
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM checkin WHERE status IN (?, ?) "
+                "AND finished_at < ?",
+                (STATUS_DONE, STATUS_FAILED, time.time() - self.retention)
+            )
+        finally:
+            conn.close()
+
+    def stats(self, window=300):
+        """ Returns queue depth per status, the age of the oldest unfinished
+        check-in and the end-to-end lag of check-ins finished within the
+        last `window` seconds.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            depth = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM checkin GROUP BY status"
+            ).fetchall())
+            oldest = conn.execute(
+                "SELECT MIN(enqueued_at) FROM checkin "
+                "WHERE status IN (?, ?)",
+                (STATUS_PENDING, STATUS_PROCESSING)
+            ).fetchone()[0]
+            lag = conn.execute(
+                "SELECT COUNT(*), AVG(finished_at - enqueued_at), "
+                "MAX(finished_at - enqueued_at) FROM checkin "
+                "WHERE status = ? AND finished_at >= ?",
+                (STATUS_DONE, now - window)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        return {
+            'depth': {
+                status: depth.get(status, 0)
+                for status in (STATUS_PENDING, STATUS_PROCESSING,
+                               STATUS_DONE, STATUS_FAILED)
+            },
+            'oldest_unfinished_age': now - oldest if oldest else 0,
+            'lag': {
+                'window': window,
+                'count': lag[0],
+                'avg': lag[1] or 0,
+                'max': lag[2] or 0,
+            },
+        }
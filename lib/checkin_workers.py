@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+import arrow
+from lib.errors import GeocodingUnavailable
+from lib.models import Location
+
+_logger = logging.getLogger(__name__)
+
+
+class CheckinWorkerPool(object):
+    """ Background threads draining a `CheckinQueue`.
+
+    Each queued check-in is geocoded, unless it was accepted with the
+    coordinates of a picked suggestion, and written with
+    `LocationRepo.create`.  Failures are retried with exponential backoff
+    until `max_attempts` is reached.  GeoNames being unavailable is retried
+    every `unavailable_delay` seconds or later without counting as an
+    attempt.  Workers run inside an application context of `app` so they
+    can reach the registry like request handlers do.
+    """
+
+    PURGE_INTERVAL = 10 * 60
+
+    def __init__(self, app, queue, size=2, max_attempts=5, backoff=2,
+                 max_backoff=60 * 60, unavailable_delay=60,
+                 poll_interval=1):
+        """
+        Arguments:
+            app: Flask app whose registry holds the clients and repos.
+            queue: `lib.checkin_queue.CheckinQueue` to drain.
+            size: Number of worker threads.
+            max_attempts: Attempts before a check-in is marked failed.
+            backoff: Seconds before the first retry, doubled per attempt.
+            max_backoff: Upper bound of the retry delay in seconds.
+            unavailable_delay: Seconds before retrying a check-in GeoNames
+                could not geocode, unless it asks for longer.
+            poll_interval: Seconds an idle worker waits before polling
+                the queue again.
+        """
+        self.app = app
+        self.queue = queue
+        self.size = size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.unavailable_delay = unavailable_delay
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._purged_at = 0
+
+    def start(self):
+        for i in xrange(self.size):
+            thread = threading.Thread(target=self._run,
+                                      name='checkin-worker-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def notify(self):
+        """ Wakes idle workers after a check-in was enqueued. """
+        self._wakeup.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopped.is_set():
+                try:
+                    job = self.queue.claim()
+                except Exception:
+                    _logger.exception('could not claim check-in')
+                    job = None
+
+                if not job:
+                    self._purge()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+
+                self._process(*job)
+
+    def _process(self, checkin_id, payload, attempts):
+        registry = self.app.extensions['registry']
+        try:
+            if payload.get('latitude') is not None:
+                place = {'lat': payload['latitude'],
+                         'lng': payload['longitude']}
+            else:
+                results = registry['GEONAMES_CLIENT'].search(
+                    payload['location_name'])
+                place = results[0] if results else None
+            if not place:
+                self.queue.fail(checkin_id, 'no location found by that name')
+                return
+
+            registry['DB_LOCATION'].create(Location({
+                'username': payload['username'],
+                'location_name': payload['location_name'],
+                'timestamp_created': (
+                    arrow.get(payload['timestamp_created']).datetime),
+                'latitude': float(place['lat']),
+                'longitude': float(place['lng'])
+            }))
+        except GeocodingUnavailable as e:
+            # running out of quota is not the check-in's fault, so wait for
+            # the budget to come back without spending one of its attempts
+            _logger.warning('check-in %s not geocoded: %s', checkin_id,
+                            e.message)
+            self.queue.retry(checkin_id, 'location lookup is unavailable',
+                             max(e.retry_after or 0, self.unavailable_delay),
+                             count_attempt=False)
+            return
+        except Exception:
+            # the error is shown to whoever asks for the status, so the
+            # details only go to the log
+            _logger.exception('check-in %s failed', checkin_id)
+            if attempts >= self.max_attempts:
+                self.queue.fail(checkin_id, 'could not save the check-in')
+            else:
+                self.queue.retry(checkin_id, 'could not save the check-in',
+                                 self._delay(attempts))
+            return
+
+        self.queue.complete(checkin_id)
+
+    def _delay(self, attempts):
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def _purge(self):
+        now = time.time()
+        if now - self._purged_at < self.PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        try:
+            self.queue.purge()
+        except Exception:
+            _logger.exception('could not purge finished check-ins')
@@ -119,7 +119,7 @@ class SimpleClient(object):
                                              **kwargs)
 
     def execute(self, query, params=None, timeout=None, use_prepared=False,
-                **kwargs):
+                host=None, **kwargs):
         """
         See https://datastax.github.io/python-driver/api/cassandra/query.html
         for an explanation of the fetch_size and consistency_level arguments
@@ -127,25 +127,32 @@ class SimpleClient(object):
         :param params:
         :param timeout:
         :param use_prepared:
+        :param host: send the query to this host instead of letting the
+            load balancing policy pick one
         :param kwargs:
         :return:
         """
         statement = self._create_statement(query, use_prepared, **kwargs)
+        options = {'host': host} if host else {}
         if use_prepared:
             statement = statement.bind(params)
-            return self.session.execute(statement, timeout=timeout)
+            return self.session.execute(statement, timeout=timeout,
+                                        **options)
 
-        return self.session.execute(statement, params, timeout=timeout)
+        return self.session.execute(statement, params, timeout=timeout,
+                                    **options)
 
-    def execute_async(self, query, params=None, use_prepared=False, **kwargs):
+    def execute_async(self, query, params=None, use_prepared=False,
+                      host=None, **kwargs):
         statement = self._create_statement(query,
                                            use_prepared=use_prepared,
                                            **kwargs)
+        options = {'host': host} if host else {}
         if use_prepared:
             statement = statement.bind(params)
-            return self.session.execute_async(statement)
+            return self.session.execute_async(statement, **options)
 
-        return self.session.execute_async(statement, params)
+        return self.session.execute_async(statement, params, **options)
 
     def execute_no_paging(self, query, params=None):
         return self.session.execute(
@@ -0,0 +1,292 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import requests
+from lib.cache import TTLCache
+from lib.errors import GeocodingUnavailable
+from lib.quota import PRIORITY_AUTOCOMPLETE, PRIORITY_CHECKIN
+from lib.singleflight import SingleFlight
+
+_logger = logging.getLogger(__name__)
+
+# status codes GeoNames answers with once the account is over its credits
+# https://www.geonames.org/export/webservice-exception.html
+_QUOTA_STATUS_CODES = (18, 19, 20)
+
+
+class GeoNamesClient(object):
+    """ Thin client around the GeoNames search api.
+
+    Suggestions handed out by `suggest` carry a token holding the place's
+    geonameId, name and coordinates, signed with `secret`.  A check-in made
+    from a suggestion is resolved from the token alone, so it needs no second
+    round trip to GeoNames and works in any process sharing the secret.
+
+    Suggestion lookups are cached per (orderby, prefix).  Identical lookups
+    in flight at the same time share one upstream call, and a cached result
+    that already holds every match for a shorter prefix answers longer
+    prefixes without going upstream.
+
+    With a `limiter`, upstream calls spend credits of the shared account.
+    Once they run out, suggestions are served from whatever is cached and
+    searches fall back to places seen before, raising `GeocodingUnavailable`
+    when nothing is known.
+    """
+    SEARCH_URL = "http://api.geonames.org/searchJSON"
+    SUGGESTION_ROWS = 10
+
+    def __init__(self, secret, username='dimagi', limiter=None,
+                 result_ttl=300, max_results=2000, place_ttl=24 * 60 * 60,
+                 max_places=10000, timeout=5):
+        """
+        Arguments:
+            secret: Key suggestion tokens are signed with, the same for
+                every process serving the app.
+            username: GeoNames account the requests are made with.
+            limiter: `lib.quota.QuotaLimiter` guarding the account credits.
+            result_ttl: Seconds a suggestion lookup result is reused.
+            max_results: Maximum number of suggestion lookups cached.
+            place_ttl: Seconds searched and suggested place names are
+                remembered.
+            max_places: Maximum number of place names remembered.
+            timeout: Seconds to wait on GeoNames before giving up.
+        """
+        self.username = username
+        self.limiter = limiter
+        self.timeout = timeout
+        self._secret = secret
+        self._results = TTLCache(maxsize=max_results, ttl=result_ttl)
+        self._searches = TTLCache(maxsize=max_places, ttl=place_ttl)
+        self._places = TTLCache(maxsize=max_places, ttl=place_ttl)
+        self._in_flight = SingleFlight()
+
+    def _request(self, priority, **params):
+        if self.limiter and not self.limiter.acquire(priority):
+            raise GeocodingUnavailable(
+                'GeoNames quota exhausted',
+                retry_after=self.limiter.retry_after(priority)
+            )
+
+        params['username'] = self.username
+        try:
+            response = requests.get(self.SEARCH_URL, params=params,
+                                    timeout=self.timeout)
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            _logger.warning('GeoNames request failed: %s', e)
+            raise GeocodingUnavailable('GeoNames request failed')
+
+        if 'geonames' not in data:
+            status = data.get('status', {})
+            _logger.warning('GeoNames error: %s', status.get('message'))
+            if status.get('value') in _QUOTA_STATUS_CODES:
+                if self.limiter:
+                    self.limiter.exhaust()
+                raise GeocodingUnavailable(
+                    'GeoNames quota exhausted',
+                    retry_after=(self.limiter.retry_after(priority)
+                                 if self.limiter else None)
+                )
+            raise GeocodingUnavailable(
+                status.get('message') or 'GeoNames request failed')
+
+        return data
+
+    def search(self, location_name):
+        """ Returns the best GeoNames match for a location name as a list
+        holding at most one record.
+        Raises:
+            GeocodingUnavailable: GeoNames cannot be asked and the name was
+                not resolved before.
+        """
+        key = location_name.strip().lower()
+        place = self._searches.get(key)
+        if place:
+            return [place]
+
+        try:
+            results = self._request(PRIORITY_CHECKIN, name=location_name,
+                                    maxRows=1)['geonames']
+        except GeocodingUnavailable:
+            place = self._places.get(key)
+            if place:
+                return [place]
+            raise
+
+        if results:
+            self._searches.set(key, _compact(results[0]))
+        return results
+
+    def geocode(self, location_name, token=None):
+        """ Resolves the coordinates of a check-in location, preferring a
+        picked suggestion over searching by name.
+        Returns:
+            dict with `name`, `lat` and `lng`, or None if nothing matches.
+        Raises:
+            GeocodingUnavailable: the name has to be searched but GeoNames
+                cannot be asked.
+        """
+        place = self.resolve_suggestion(token, location_name)
+        if place:
+            return place
+
+        results = self.search(location_name)
+        return results[0] if results else None
+
+    def suggest(self, location_name, orderby):
+        """ Returns up to 10 GeoNames records whose name starts with
+        `location_name`.  Each record is given a `token` that
+        `resolve_suggestion` accepts.
+
+        When GeoNames cannot be asked, a truncated cached result for a
+        shorter prefix is narrowed instead, which may be empty.
+        """
+        prefix = location_name.strip().lower()
+        suggestions = self._cached_suggestions(prefix, orderby)
+        if suggestions is None:
+            try:
+                suggestions = self._in_flight.do(
+                    (orderby, prefix), self._fetch_suggestions, prefix,
+                    orderby)
+            except GeocodingUnavailable:
+                suggestions = self._cached_suggestions(prefix, orderby,
+                                                       degraded=True)
+
+        results = []
+        for suggestion in suggestions[:self.SUGGESTION_ROWS]:
+            suggestion = dict(suggestion)
+            suggestion['token'] = self._remember(suggestion)
+            results.append(suggestion)
+        return results
+
+    def _cached_suggestions(self, prefix, orderby, degraded=False):
+        """ Returns cached suggestions for `prefix`, narrowing the result of
+        a shorter prefix when that result is known to be exhaustive.
+        Returns None when the lookup has to go upstream.
+
+        With `degraded`, truncated results are narrowed as well and an empty
+        list is returned when nothing is cached.
+        """
+        cached = self._results.get((orderby, prefix))
+        if cached is not None:
+            return cached[0]
+
+        for length in xrange(len(prefix) - 1, 0, -1):
+            cached = self._results.get((orderby, prefix[:length]))
+            if cached is None:
+                continue
+
+            suggestions, exhaustive = cached
+            narrowed, uncertain = [], False
+            for suggestion in suggestions:
+                match = _starts_with(suggestion, prefix)
+                uncertain = uncertain or match is None
+                if match or (match is None and degraded):
+                    narrowed.append(suggestion)
+            if degraded:
+                return narrowed
+
+            if not exhaustive or uncertain:
+                # a shorter prefix was truncated, so even shorter ones
+                # cannot be exhaustive either.  Records only matching by
+                # an alternate name may or may not be returned upstream
+                return None
+
+            self._results.set((orderby, prefix), (narrowed, True))
+            return narrowed
+
+        return [] if degraded else None
+
+    def _fetch_suggestions(self, prefix, orderby):
+        response = self._request(PRIORITY_AUTOCOMPLETE,
+                                 name_startsWith=prefix,
+                                 maxRows=self.SUGGESTION_ROWS,
+                                 orderby=orderby)
+        suggestions = response['geonames']
+        # without a count there is no telling whether more matches exist
+        exhaustive = (
+            response.get('totalResultsCount', float('inf')) <=
+            len(suggestions))
+        self._results.set((orderby, prefix), (suggestions, exhaustive))
+        return suggestions
+
+    def _remember(self, record):
+        place = _compact(record)
+
+        # lets check-ins typed by hand still resolve while degraded
+        self._places.set(record['name'].strip().lower(), place)
+        return self._sign(json.dumps(
+            [record['geonameId'], place['name'], place['lat'], place['lng']],
+            separators=(',', ':')))
+
+    def _sign(self, payload):
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8'))
+        return '%s.%s' % (encoded.rstrip('='), self._signature(encoded))
+
+    def _signature(self, encoded):
+        return hmac.new(self._secret, encoded.rstrip('='),
+                        hashlib.sha256).hexdigest()[:32]
+
+    def _unsign(self, token):
+        """ Returns the payload of a token made by `_sign`, or None if it
+        was not signed with our secret.
+        """
+        encoded, _, signature = str(token).partition('.')
+        if not hmac.compare_digest(self._signature(encoded), signature):
+            return None
+        padding = '=' * (-len(encoded) % 4)
+        return base64.urlsafe_b64decode(encoded + padding).decode('utf-8')
+
+    def resolve_suggestion(self, token, location_name=None):
+        """ Looks up a suggestion handed out by `suggest`.
+        Arguments:
+            token: Suggestion token from an autocomplete response.
+            location_name: If given, the suggestion must carry this name.
+                Guards against the input being edited after a suggestion
+                was picked.
+        Returns:
+            dict with `name`, `lat` and `lng`, or None if the token is
+            malformed, not signed by us or does not match `location_name`.
+        """
+        if not token:
+            return None
+
+        try:
+            payload = self._unsign(token)
+            if payload is None:
+                return None
+            _, name, lat, lng = json.loads(payload)
+        except (TypeError, ValueError, UnicodeError):
+            return None
+        suggestion = {'name': name, 'lat': lat, 'lng': lng}
+
+        if location_name is not None and (
+                suggestion['name'].strip().lower() !=
+                location_name.strip().lower()):
+            return None
+
+        return suggestion
+
+
+def _compact(record):
+    return {
+        'name': record['name'],
+        'lat': record['lat'],
+        'lng': record['lng'],
+    }
+
+
+def _starts_with(record, prefix):
+    """ Whether GeoNames' `name_startsWith` would match a record: True if
+    its name starts with `prefix`, None if only its ascii or toponym name
+    does, which upstream may or may not count, and False otherwise.
+    """
+    if (record.get('name') or u'').lower().startswith(prefix):
+        return True
+    for key in ('asciiName', 'toponymName'):
+        name = record.get(key)
+        if name and name.lower().startswith(prefix):
+            return None
+    return False
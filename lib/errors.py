@@ -12,4 +12,10 @@ class ResourceNotFound(Exception):
 
 class EmailExistsError(Exception):
     def __init__(self, message=None):
-        self.message = message
\ No newline at end of file
+        self.message = message
+
+
+class GeocodingUnavailable(Exception):
+    def __init__(self, message=None, retry_after=None):
+        self.message = message
+        self.retry_after = retry_after
@@ -0,0 +1,163 @@
+import logging
+import sqlite3
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class EventLog(object):
+    """ Append-only log of events, numbered in the order they were added.
+
+    Backed by a sqlite file so that every process on the host appends to
+    and reads from the same sequence, whichever process created an event.
+    Events are kept for `retention` seconds.
+    """
+
+    def __init__(self, path, retention=60 * 60):
+        """
+        Arguments:
+            path: sqlite file holding the log.
+            retention: Seconds events are kept.
+        """
+        self.path = path
+        self.retention = retention
+        self._initialize()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _initialize(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS event (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        finally:
+            conn.close()
+
+    def append(self, key, payload):
+        """ Adds an event.
+        Arguments:
+            key: What the event is about, e.g. a username.
+            payload: Event data as a string.
+        Returns:
+            id of the event.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO event (key, payload, created_at) "
+                "VALUES (?, ?, ?)",
+                (key, payload, time.time())
+            )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def since(self, last_id, limit=1000):
+        """ Returns up to `limit` (id, key, payload) tuples of the events
+        after `last_id`, oldest first.
+        """
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT id, key, payload FROM event WHERE id > ? "
+                "ORDER BY id LIMIT ?",
+                (last_id, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def latest_id(self):
+        """ Returns the id of the newest event, 0 if there is none. """
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT MAX(id) FROM event").fetchone()[0] or 0
+        finally:
+            conn.close()
+
+    def purge(self):
+        """ Drops events older than the retention period. """
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM event WHERE created_at < ?",
+                         (time.time() - self.retention,))
+        finally:
+            conn.close()
+
+
+class EventRelay(object):
+    """ Background thread publishing the events of an `EventLog` to a
+    `lib.broadcast.Broadcaster` as they are appended.  A single poll per
+    interval serves every subscriber of the process.
+    """
+
+    PURGE_INTERVAL = 10 * 60
+
+    # events read from the log at once
+    BATCH_SIZE = 1000
+
+    def __init__(self, log, broadcaster, poll_interval=0.25):
+        """
+        Arguments:
+            log: `EventLog` to follow.
+            broadcaster: `lib.broadcast.Broadcaster` to publish to.
+            poll_interval: Seconds between looking for new events.
+        """
+        self.log = log
+        self.broadcaster = broadcaster
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_id = 0
+        self._purged_at = 0
+
+    def start(self):
+        # fill the broadcaster's history, so clients reconnecting after a
+        # restart can still catch up
+        self._last_id = max(
+            self.log.latest_id() - self.broadcaster.history, 0)
+        self._relay()
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='event-relay')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self._relay()
+                self._purge()
+            except Exception:
+                _logger.exception('could not relay events')
+
+    def _relay(self):
+        while True:
+            events = self.log.since(self._last_id, self.BATCH_SIZE)
+            for event_id, key, payload in events:
+                self.broadcaster.publish(key, payload, event_id)
+                self._last_id = event_id
+            if len(events) < self.BATCH_SIZE:
+                return
+
+    def _purge(self):
+        now = time.time()
+        if now - self._purged_at < self.PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        self.log.purge()
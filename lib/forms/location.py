@@ -1,6 +1,17 @@
-from wtforms import Form, StringField, validators
+from wtforms import Form, HiddenField, StringField, validators
+
+# user pages live at /<username>, so these would be shadowed by other routes
+RESERVED_USERNAMES = (
+    'new', 'autocomplete', 'stream', 'checkins', 'metrics', 'analytics',
+    'tiles',
+)
 
 
 class LocationForm(Form):
-    username = StringField('username', [validators.InputRequired()])
+    username = StringField('username', [
+        validators.InputRequired(),
+        validators.NoneOf(RESERVED_USERNAMES,
+                          message='this username is reserved'),
+    ])
     location_name = StringField('location name', [validators.InputRequired()])
+    suggestion_token = HiddenField('suggestion token')
@@ -3,9 +3,12 @@ from datetime import datetime
 from dateutil.tz import tzutc
 from cassandra.util import OrderedMap
 from cassandra.util import SortedSet
+import copy
 import json
 from uuid import UUID
 
+_NOT_SET = object()
+
 
 class JsonSerializableBase(object):
     """ Provides functions for serializing and deserializing objects to json.
@@ -27,8 +30,17 @@ class JsonSerializableBase(object):
 class Field(object):
     BASE_TYPE = None
 
+    # values that can be changed in place, which assigning the attribute
+    # does not catch, so the model has to compare them against a snapshot
+    MUTABLE = False
+
+    # column values of these types are only decoded when first read on
+    # models loaded with `Model.from_row`
+    LAZY_TYPES = ()
+
     def __init__(self, columnname=None, default=None):
         self.columnname = columnname
+        self.attrname = None
 
         # validate default type is appropriate for field
         if default is not None and not isinstance(default, self.BASE_TYPE):
@@ -38,7 +50,7 @@ class Field(object):
         self.default = default
 
     def __get__(self, instance, objtype):
-        value = instance._data.get(self.columnname)
+        value = self._load(instance)
         if value is not None:
             return value
         return self.default
@@ -46,9 +58,54 @@ class Field(object):
     def __set__(self, instance, value):
         instance._data[self.columnname] = value
 
+    def _load(self, instance):
+        """ Returns the stored value, decoding a raw value left by
+        `hydrate` on first access.  A raw value that fails to decode is
+        kept, so it is still written back as read.
+        """
+        raw = instance._raw.get(self.columnname, _NOT_SET)
+        if raw is not _NOT_SET:
+            instance._data[self.columnname] = self.decode(raw)
+            del instance._raw[self.columnname]
+            if instance._persisted:
+                # the column value doubles as the snapshot in-place
+                # changes are compared against
+                instance._snapshots.setdefault(self.attrname, raw)
+        return instance._data.get(self.columnname)
+
+    def hydrate(self, instance, raw):
+        """ Stores a value as read from cassandra.  Values of `LAZY_TYPES`
+        are trusted and kept as they are until the attribute is first read,
+        anything else is assigned as usual.
+        """
+        if self.LAZY_TYPES and isinstance(raw, self.LAZY_TYPES):
+            instance._data.pop(self.columnname, None)
+            instance._raw[self.columnname] = raw
+        else:
+            self.__set__(instance, raw)
+
+    def decode(self, raw):
+        """ Converts a raw column value into the attribute value. """
+        return raw
+
+    def snapshot(self, value):
+        """ Returns a copy of `value` that later changes made to it in
+        place do not affect.
+        """
+        return copy.deepcopy(value)
+
+    def changed(self, snapshot, value):
+        """ Whether `value` differs from a `snapshot` or raw column value.
+        """
+        return self.decode(snapshot) != value
+
     def serialize(self, value):
         return value
 
+    def serialize_raw(self, raw):
+        """ Serializes a value that was never decoded. """
+        return raw
+
 class BooleanField(Field):
     BASE_TYPE = bool
 
@@ -121,6 +178,8 @@ class JsonWrappedClassField(Field):
     """ Wrapper class for data that is serialized to json and has an
     accompanying wrapper class which inherits `JsonSerializableBase`
     """
+    MUTABLE = True
+    LAZY_TYPES = basestring
 
     def __init__(self, columnname=None, default_fn=None, wrapper_cls=None):
         """
@@ -144,7 +203,7 @@ class JsonWrappedClassField(Field):
     def __get__(self, instance, objtype):
         value = super(JsonWrappedClassField, self).__get__(instance, objtype)
         if value:
-            return value
+            return instance._watch(self, value)
 
         if self._default_fn:
             return self._default_fn()
@@ -159,12 +218,22 @@ class JsonWrappedClassField(Field):
         if isinstance(value, self._wrapper_cls):
             instance._data[self.columnname] = value
         elif isinstance(value, basestring):
-            instance._data[self.columnname] = (
-                self._wrapper_cls.from_json(value)
-            )
+            instance._data[self.columnname] = self.decode(value)
         else:
             raise Exception("Unsupported type %s" % type(instance))
 
+    def decode(self, raw):
+        return self._wrapper_cls.from_json(raw)
+
+    def snapshot(self, value):
+        return self.serialize(value)
+
+    def changed(self, snapshot, value):
+        if not snapshot:
+            return bool(value)
+        # wrappers need not compare by value, their json does
+        return self.serialize(self.decode(snapshot)) != self.serialize(value)
+
     def serialize(self, value):
         if not value:
             return None
@@ -182,6 +251,8 @@ class JsonDataField(Field):
     deserialization for all data in that field.
     """
     BASE_TYPE = basestring
+    MUTABLE = True
+    LAZY_TYPES = basestring
 
     def __init__(self, columnname=None, default=None):
         super(JsonDataField, self).__init__(
@@ -189,6 +260,12 @@ class JsonDataField(Field):
             default=default
         )
 
+    def __get__(self, instance, objtype):
+        value = super(JsonDataField, self).__get__(instance, objtype)
+        if value is None:
+            return None
+        return instance._watch(self, value)
+
     def __set__(self, instance, value):
         if value is None:
             instance._data[self.columnname] = None
@@ -202,27 +279,38 @@ class JsonDataField(Field):
             )
 
         if isinstance(value, self.BASE_TYPE):
-            decoded = json.loads(value)
-
-            if not isinstance(decoded, (dict, list)):
-                raise Exception(
-                    "Decoded Json in Property %s must be an instance of "
-                    "dict or list" % (
-                        self.columnname
-                    )
-                )
-
-            instance._data[self.columnname] = decoded
+            instance._data[self.columnname] = self.decode(value)
             return
 
         instance._data[self.columnname] = value
 
+    def decode(self, raw):
+        decoded = json.loads(raw)
+
+        if not isinstance(decoded, (dict, list)):
+            raise Exception(
+                "Decoded Json in Property %s must be an instance of "
+                "dict or list" % (
+                    self.columnname
+                )
+            )
+
+        return decoded
+
     def serialize(self, value):
         if not value:
             return None
 
         return json.dumps(value)
 
+    def snapshot(self, value):
+        return self.serialize(value)
+
+    def changed(self, snapshot, value):
+        if not snapshot:
+            return bool(value)
+        return self.decode(snapshot) != value
+
 
 class StringField(Field):
     BASE_TYPE = basestring
@@ -237,10 +325,12 @@ class StringField(Field):
 
 class MapField(Field):
     BASE_TYPE = dict
+    MUTABLE = True
+    LAZY_TYPES = OrderedMap
 
     def __set__(self, instance, value):
         if isinstance(value, OrderedMap):
-            value = dict(value.iteritems())
+            value = self.decode(value)
         if value and not isinstance(value, self.BASE_TYPE):
             raise Exception("Property %s must be an instance of dict" % (
                 self.columnname
@@ -253,16 +343,30 @@ class MapField(Field):
         instance._data[self.columnname] = value
 
     def __get__(self, instance, objtype):
-        if instance._data.get(self.columnname) is None:  # explicit None check
+        if self._load(instance) is None:  # explicit None check
             if self.default:
                 instance._data[self.columnname] = self.default
             else:
                 instance._data[self.columnname] = dict()
-        return instance._data[self.columnname]
+        return instance._watch(self, instance._data[self.columnname])
+
+    def decode(self, raw):
+        value = dict(raw.iteritems())
+        # adds timezone info for dicts with datetimes
+        # fields that are just datetimes have this info added in
+        # DateTimeField
+        for k, v in value.iteritems():
+            if isinstance(v, datetime) and not v.tzinfo:
+                value[k] = v.replace(tzinfo=tzutc())
+        return value
+
+    def serialize_raw(self, raw):
+        return self.serialize(self.decode(raw))
 
 
 class SetField(Field):
     BASE_TYPE = set
+    MUTABLE = True
 
     def __set__(self, instance, value):
         if value and not (isinstance(value, set) or
@@ -283,7 +387,11 @@ class SetField(Field):
                 instance._data[self.columnname] = self.default
             else:
                 instance._data[self.columnname] = set()
-        return instance._data[self.columnname]
+        return instance._watch(self, instance._data[self.columnname])
+
+    def snapshot(self, value):
+        # members are hashable, so copying the set itself is enough
+        return copy.copy(value)
 
 
 class UuidField(Field):
@@ -321,14 +429,25 @@ class ModelMeta(type):
                 # use name of attribute if there is no columnname
                 if not field_obj.columnname:
                     field_obj.columnname = attrname
+                field_obj.attrname = attrname
                 cls._registry[name][attrname] = field_obj
         return super(ModelMeta, cls).__new__(cls, name, bases, attrs)
 
 
 class Model(object):
+    """ Base class for models.
+    Models created from data are new, every field is dirty and every value
+    is validated right away.  Models created with `from_row` hold stored
+    data: json and map columns are only decoded when first read, and only
+    fields changed since loading are dirty.
+    """
     __metaclass__ = ModelMeta
 
     def __init__(self, data=None):
+        self._raw = {}
+        self._dirty = set()
+        self._snapshots = {}
+        self._persisted = False
         self._data = {}
 
         if not data:
@@ -341,6 +460,67 @@ class Model(object):
                 raise Exception("Invalid attribute %s" % key)
             setattr(self, key, value)
 
+    @classmethod
+    def from_row(cls, data):
+        """ Creates a model from a row read from cassandra, see
+        `model_helpers.row_to_dict`.
+        """
+        model = cls()
+        r = ModelMeta._registry[cls.__name__]
+        for key, value in data.iteritems():
+            if key not in r:
+                raise Exception("Invalid attribute %s" % key)
+            r[key].hydrate(model, value)
+        model.mark_clean()
+        return model
+
+    def __setattr__(self, name, value):
+        field = ModelMeta._registry[self.__class__.__name__].get(name)
+        if field is None:
+            return super(Model, self).__setattr__(name, value)
+
+        self._raw.pop(field.columnname, None)
+        self._snapshots.pop(name, None)
+        super(Model, self).__setattr__(name, value)
+        self._dirty.add(name)
+
+    def _watch(self, field, value):
+        """ Snapshots a mutable value handed out by a stored model, so that
+        changes made to it in place show up in `dirty_fields`.
+        """
+        if (self._persisted and field.attrname not in self._dirty and
+                field.attrname not in self._snapshots):
+            self._snapshots[field.attrname] = field.snapshot(value)
+        return value
+
+    def mark_clean(self):
+        """ Marks the model as matching what is stored, e.g. after it was
+        written.
+        """
+        self._persisted = True
+        self._dirty = set()
+        self._snapshots = {}
+
+        # values already handed out may still be changed in place
+        r = ModelMeta._registry[self.__class__.__name__]
+        for attrname, fieldobj in r.iteritems():
+            if fieldobj.MUTABLE and fieldobj.columnname in self._data:
+                self._watch(fieldobj, getattr(self, attrname))
+
+    def dirty_fields(self):
+        """ returns set of attributes changed since the model was loaded
+        or marked clean.  All attributes of a new model are dirty.
+        """
+        r = ModelMeta._registry[self.__class__.__name__]
+        if not self._persisted:
+            return set(r)
+
+        dirty = set(self._dirty)
+        for attrname, snapshot in self._snapshots.iteritems():
+            if r[attrname].changed(snapshot, getattr(self, attrname)):
+                dirty.add(attrname)
+        return dirty
+
     def __repr__(self):
         str = "<%s " % self.__class__.__name__
         pairs = []
@@ -383,15 +563,25 @@ class Model(object):
             attr: getattr(self, attr) for attr in self.attributes
         }
 
-    def serialize(self):
+    def serialize(self, dirty_only=False):
         """ Serialize all fields for writing to cassandra.
         Similar to the `to_dict` method, but some fields require certain
         serialization to properly write to cassandra.
+        Arguments:
+            dirty_only: only serialize the fields returned by
+                `dirty_fields`.
         """
         r = ModelMeta._registry[self.__class__.__name__]
+        attrnames = self.dirty_fields() if dirty_only else r.keys()
         serialized = {}
-        for attrname, fieldobj in r.iteritems():
-            serialized_value = fieldobj.serialize(getattr(self, attrname))
+        for attrname in attrnames:
+            fieldobj = r[attrname]
+            if fieldobj.columnname in self._raw:
+                # never decoded, so there is nothing to encode again
+                serialized_value = fieldobj.serialize_raw(
+                    self._raw[fieldobj.columnname])
+            else:
+                serialized_value = fieldobj.serialize(getattr(self, attrname))
             serialized[fieldobj.columnname] = serialized_value
 
         return serialized
\ No newline at end of file
@@ -1,25 +1,25 @@
+import json
 from datetime import datetime
-from cassandra.util import OrderedMap
-from dateutil.tz import tzutc
 
 
 def row_to_dict(row):
     """ Takes a namedtuple result from a cassandra
     query and converts it into a form that is ammenable
-    to insert into a model.
+    to insert into a model with `Model.from_row`.
+    Map columns are left as `OrderedMap`s, `MapField` converts them when
+    they are first read.
+    """
+    return dict(row._asdict())
+
+
+def model_to_json(model):
+    """ Serializes a model's attributes to a json string, writing datetimes
+    in iso format.
     """
     d = {}
-    for name, attr in row._asdict().iteritems():
-        if isinstance(attr, OrderedMap):
-            attr = dict(attr.iteritems())
-            # adds timezone info for dicts with datetimes
-            # fields that are just datetimes have this info added in
-            # CassandraModel DateTimeField
-            for k in attr.keys():
-                v = attr[k]
-                if isinstance(v, datetime) and not v.tzinfo:
-                    v = v.replace(tzinfo=tzutc())
-                    attr[k] = v
-        d[name] = attr
+    for attr, value in model.to_dict().iteritems():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        d[attr] = value
 
-    return d
+    return json.dumps(d)
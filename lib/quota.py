@@ -0,0 +1,148 @@
+import sqlite3
+import time
+
+PRIORITY_CHECKIN = 'checkin'
+PRIORITY_AUTOCOMPLETE = 'autocomplete'
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class QuotaLimiter(object):
+    """ Token buckets guarding the credits of a shared upstream account.
+
+    Bucket state lives in a sqlite file so every worker process on the host
+    draws from the same hourly and daily budgets.  Low priority callers
+    (autocomplete) may only spend credits while more than `reserve` of each
+    budget is left, keeping the remainder for check-in creation.
+    """
+
+    def __init__(self, path, hourly_limit=1000, daily_limit=20000,
+                 reserve=0.2):
+        """
+        Arguments:
+            path: sqlite file holding the bucket state.
+            hourly_limit: Credits available per hour.
+            daily_limit: Credits available per day.
+            reserve: Fraction of each budget only check-ins may spend.
+        """
+        self.path = path
+        self.reserve = reserve
+        self._buckets = {
+            'hourly': (float(hourly_limit), HOUR),
+            'daily': (float(daily_limit), DAY),
+        }
+        self._initialize()
+
+    def _connect(self):
+        # autocommit mode, transactions are started explicitly so that
+        # BEGIN IMMEDIATE serializes writers across processes
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _initialize(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quota_bucket (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            now = time.time()
+            for name, (capacity, _) in self._buckets.iteritems():
+                conn.execute(
+                    "INSERT OR IGNORE INTO quota_bucket VALUES (?, ?, ?)",
+                    (name, capacity, now)
+                )
+        finally:
+            conn.close()
+
+    def _refilled(self, conn, now):
+        """ Returns the current token count of every bucket. """
+        tokens = {}
+        rows = conn.execute(
+            "SELECT name, tokens, updated_at FROM quota_bucket")
+        for name, count, updated_at in rows:
+            if name not in self._buckets:
+                continue
+            capacity, period = self._buckets[name]
+            elapsed = max(now - updated_at, 0)
+            tokens[name] = min(capacity, count + elapsed * capacity / period)
+        return tokens
+
+    def _store(self, conn, tokens, now):
+        for name, count in tokens.iteritems():
+            conn.execute(
+                "UPDATE quota_bucket SET tokens = ?, updated_at = ? "
+                "WHERE name = ?",
+                (count, now, name)
+            )
+
+    def _floor(self, name, priority):
+        if priority == PRIORITY_CHECKIN:
+            return 0
+        return self._buckets[name][0] * self.reserve
+
+    def acquire(self, priority, cost=1):
+        """ Spends `cost` credits from every bucket.
+        Returns:
+            True if the credits were available for `priority`, False if
+            the call should not be made.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # closing the connection rolls back the transaction on errors
+            conn.execute("BEGIN IMMEDIATE")
+            tokens = self._refilled(conn, now)
+            allowed = all(
+                count - cost >= self._floor(name, priority)
+                for name, count in tokens.iteritems()
+            )
+            if allowed:
+                tokens = {
+                    name: count - cost for name, count in tokens.iteritems()
+                }
+            self._store(conn, tokens, now)
+            conn.execute("COMMIT")
+            return allowed
+        finally:
+            conn.close()
+
+    def exhaust(self):
+        """ Empties every bucket.  Used when the upstream reports the account
+        is over its limit even though the local buckets disagree.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE quota_bucket SET tokens = 0, updated_at = ?",
+                         (time.time(),))
+        finally:
+            conn.close()
+
+    def retry_after(self, priority, cost=1):
+        """ Returns the seconds until `cost` credits are available again
+        for `priority`.
+        """
+        conn = self._connect()
+        try:
+            tokens = self._refilled(conn, time.time())
+        finally:
+            conn.close()
+
+        wait = 0
+        for name, count in tokens.iteritems():
+            capacity, period = self._buckets[name]
+            missing = self._floor(name, priority) + cost - count
+            if missing > 0:
+                wait = max(wait, missing * period / capacity)
+        return int(wait) + 1 if wait else 0
+
+    def remaining(self):
+        """ Returns the credits left in every bucket. """
+        conn = self._connect()
+        try:
+            return self._refilled(conn, time.time())
+        finally:
+            conn.close()
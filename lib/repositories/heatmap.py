@@ -0,0 +1,227 @@
+from flask import current_app
+import logging
+import Queue
+import threading
+import numpy as np
+from lib.analytics.heatmap import MAX_ZOOM, aggregate
+from lib.cache import TTLCache
+
+_logger = logging.getLogger(__name__)
+
+
+class HeatmapRepo(object):
+    """ Check-in counts per heatmap tile bin, stored as cassandra counters
+    with one partition per tile.
+
+    Tiles read are cached in process.  Check-ins created through this
+    process are added to cached tiles once counted, other processes see
+    them when their cached copy expires.
+
+    Counting is best effort and happens on a background thread, so a
+    check-in is never held up or failed by its tiles.  Check-ins queued
+    while one batch is counted make up the next one, which is binned at
+    once and added with a single increment per bin it touches.  That keeps
+    the low zoom tiles, which every check-in lands on, from taking a write
+    per check-in.
+
+    Each check-in is claimed in `location_tile_applied` first, which keeps
+    a retried `LocationRepo.create` from counting it twice, as long as the
+    retry comes within the week claims are kept.  Check-ins lost on the
+    way, e.g. to a restart, are only recovered by `rebuild`.
+    """
+
+    INCREMENT_QUERY = """
+        UPDATE location_tile_bin SET count = count + ?
+        WHERE zoom = ? AND x = ? AND y = ? AND bin = ?
+    """
+
+    CLAIM_QUERY = """
+        INSERT INTO location_tile_applied (username, timestamp_created)
+        VALUES (?, ?) IF NOT EXISTS
+    """
+
+    # counter updates sent before waiting on their results
+    MAX_IN_FLIGHT = 256
+
+    # check-ins waiting to be counted before new ones are dropped
+    MAX_PENDING = 10000
+
+    # check-ins counted at once
+    BATCH_SIZE = 1000
+
+    def __init__(self, cache_size=4096, cache_ttl=60):
+        """
+        Args:
+            cache_size: Tiles kept in the cache.
+            cache_ttl: Seconds a cached tile is served before being read
+                again.
+        """
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._cache_lock = threading.Lock()
+        self._pending = Queue.Queue(maxsize=self.MAX_PENDING)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def increment(self, location):
+        """ Queues a check-in to be added to the tiles of every zoom level.
+        Args:
+            location: model.Location that was just created.
+        """
+        if location.latitude is None or location.longitude is None:
+            return
+
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+        try:
+            self._pending.put_nowait((
+                client, location.username, location.timestamp_created,
+                location.latitude, location.longitude))
+        except Queue.Full:
+            _logger.warning('heatmap backlog is full, not counting the '
+                            'check-in of %s', location.username)
+            return
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='heatmap-counter')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._count(batch[0][0], batch)
+            except Exception:
+                _logger.exception('could not add %d check-ins to the '
+                                  'heatmap', len(batch))
+
+    def _next_batch(self):
+        """ Waits for a check-in and returns it along with the ones queued
+        behind it, up to `BATCH_SIZE`.
+        """
+        batch = [self._pending.get()]
+        while len(batch) < self.BATCH_SIZE:
+            try:
+                batch.append(self._pending.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    def _claim(self, client, batch):
+        """ Claims the check-ins of a batch concurrently.
+        Returns:
+            the check-ins that were not counted before.
+        """
+        claimed = []
+        for start in xrange(0, len(batch), self.MAX_IN_FLIGHT):
+            jobs = batch[start:start + self.MAX_IN_FLIGHT]
+            futures = [
+                client.execute_async(
+                    self.CLAIM_QUERY, params=(username, timestamp_created),
+                    use_prepared=True)
+                for _, username, timestamp_created, _, _ in jobs
+            ]
+            for job, future in zip(jobs, futures):
+                try:
+                    applied = list(future.result())[0][0]
+                except Exception:
+                    _logger.exception('could not claim check-in of %s for '
+                                      'the heatmap', job[1])
+                    continue
+                # otherwise counted by an earlier attempt at creating it
+                if applied:
+                    claimed.append(job)
+        return claimed
+
+    def _count(self, client, batch):
+        claimed = self._claim(client, batch)
+        if not claimed:
+            return
+
+        self._add(client, aggregate(
+            np.array([job[3] for job in claimed], dtype=np.float64),
+            np.array([job[4] for job in claimed], dtype=np.float64)))
+
+    def _add(self, client, tiles):
+        futures = []
+        for (zoom, x, y), counts in tiles.iteritems():
+            for b, count in counts.iteritems():
+                futures.append(client.execute_async(
+                    self.INCREMENT_QUERY, params=(count, zoom, x, y, b),
+                    use_prepared=True
+                ))
+                if len(futures) >= self.MAX_IN_FLIGHT:
+                    for future in futures:
+                        future.result()
+                    futures = []
+            self._add_to_cached(zoom, x, y, counts)
+
+        for future in futures:
+            future.result()
+
+    def _add_to_cached(self, zoom, x, y, counts):
+        with self._cache_lock:
+            cached = self._cache.get((zoom, x, y))
+            if cached is None:
+                return
+            cached = dict(cached)
+            for b, count in counts.iteritems():
+                cached[b] = cached.get(b, 0) + count
+            self._cache.set((zoom, x, y), cached)
+
+    def get_tile(self, zoom, x, y):
+        """ Returns a dict of bin to check-in count for a tile, leaving out
+        empty bins.
+        """
+        cached = self._cache.get((zoom, x, y))
+        if cached is not None:
+            return cached
+
+        query = """
+            SELECT bin, count FROM location_tile_bin
+            WHERE zoom = %(zoom)s AND x = %(x)s AND y = %(y)s
+        """
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+
+        results = client.execute(query, params={'zoom': zoom, 'x': x, 'y': y},
+                                 routing_key=[zoom, x, y])
+        tile = {result.bin: result.count for result in results}
+        with self._cache_lock:
+            self._cache.set((zoom, x, y), tile)
+        return tile
+
+    def rebuild(self, locations, chunk_size=100000):
+        """ Recomputes every tile from scratch.
+        Check-ins created while the rebuild runs may be counted twice or
+        not at all, so run it while writes are paused.
+        Args:
+            locations: Iterable of every model.Location, e.g. from
+                `LocationRepo.scan('location_by_timestamp')`.
+            chunk_size: Check-ins binned at once.
+        """
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+        client.execute("TRUNCATE location_tile_bin", use_prepared=True)
+        self._cache.clear()
+
+        latitudes, longitudes = [], []
+        for location in locations:
+            latitudes.append(location.latitude)
+            longitudes.append(location.longitude)
+            if len(latitudes) >= chunk_size:
+                self._add(client, aggregate(
+                    np.array(latitudes, dtype=np.float64),
+                    np.array(longitudes, dtype=np.float64)))
+                latitudes, longitudes = [], []
+
+        if latitudes:
+            self._add(client, aggregate(
+                np.array(latitudes, dtype=np.float64),
+                np.array(longitudes, dtype=np.float64)))
+
+    @staticmethod
+    def valid_tile(zoom, x, y):
+        return 0 <= zoom <= MAX_ZOOM and 0 <= x < 2 ** zoom and \
+            0 <= y < 2 ** zoom
@@ -2,8 +2,12 @@ from flask import current_app
 from cassandra.query import SimpleStatement
 from cassandra.policies import FallthroughRetryPolicy
 import arrow
-from lib.models.model_helpers import row_to_dict
+import logging
+from lib.models.model_helpers import row_to_dict, model_to_json
 from lib.models import Location
+from lib.repositories.scanner import TokenRangeScanner
+
+_logger = logging.getLogger(__name__)
 
 
 class LocationRepo(object):
@@ -50,6 +54,69 @@ class LocationRepo(object):
         client.execute(query, params=location_dict,
                        routing_key=location.username,
                        retry_policy=FallthroughRetryPolicy())
+        location.mark_clean()
+
+        # the check-in is stored at this point, the heatmap must not fail it
+        try:
+            current_app.extensions['registry']['DB_HEATMAP'].increment(
+                location)
+        except Exception:
+            _logger.exception('could not queue check-in for the heatmap')
+
+        try:
+            current_app.extensions['registry']['LOCATION_EVENTS'].append(
+                location.username, model_to_json(location))
+        except Exception:
+            _logger.exception('could not add check-in to the event log')
+
+    def update(self, location):
+        """ Writes only the columns of a stored location that changed
+        since it was loaded
+        Args:
+            location: model.Location read from the database
+        """
+        changed = location.serialize(dirty_only=True)
+        for key in ('username', 'timestamp_created'):
+            if key in changed:
+                raise Exception(
+                    "Property %s is part of the primary key" % key)
+        if not changed:
+            return
+
+        assignments = ', '.join(
+            '%s = %%(%s)s' % (column, column) for column in sorted(changed))
+        params = dict(changed, username=location.username,
+                      timestamp_created=location.timestamp_created)
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+
+        query = """
+        UPDATE location_by_timestamp SET %s
+        WHERE username = %%(username)s
+        AND timestamp_created = %%(timestamp_created)s
+        """ % assignments
+        client.execute(query, params=params,
+                       routing_key=location.username,
+                       retry_policy=FallthroughRetryPolicy())
+
+        # location only holds the latest check-in of every user.  It is
+        # written without lightweight transactions by create, so a check-in
+        # created between this read and the update can still be overwritten
+        query = """
+        SELECT timestamp_created FROM location WHERE username = %(username)s
+        """
+        latest = list(client.execute(query,
+                                     params={'username': location.username},
+                                     routing_key=location.username))
+        if latest and (arrow.get(latest[0].timestamp_created) ==
+                       arrow.get(location.timestamp_created)):
+            query = """
+            UPDATE location SET %s
+            WHERE username = %%(username)s
+            """ % assignments
+            client.execute(query, params=params,
+                           routing_key=location.username,
+                           retry_policy=FallthroughRetryPolicy())
+        location.mark_clean()
 
     def index(self):
         query = """
@@ -60,7 +127,7 @@ class LocationRepo(object):
         results = client.execute(query)
         if not results:
             return None
-        return [Location(row_to_dict(result)) for result in results]
+        return [Location.from_row(row_to_dict(result)) for result in results]
 
 
     def get(self, username):
@@ -72,6 +139,54 @@ class LocationRepo(object):
         results = client.execute(query, params={'username': username})
         if not results:
             return None
-        return [Location(row_to_dict(result)) for result in results]
+        return [Location.from_row(row_to_dict(result)) for result in results]
+
+    def scan(self, table='location', **options):
+        """ Streams every check-in of `table` without going through a
+        single sequential `SELECT *`.  Use `location_by_timestamp` for every
+        check-in rather than the latest one per user.
+        Args:
+            table: Table to scan.
+            options: Passed on to `TokenRangeScanner`, e.g. parallelism or
+                checkpoint_path.
+        """
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+
+        scanner = TokenRangeScanner(client, table, 'username', Location,
+                                    **options)
+        return scanner.scan()
+
+    _TRACK_QUERY = """
+        SELECT timestamp_created, latitude, longitude, location_name
+        FROM location_by_timestamp WHERE username = %(username)s
+    """
+
+    def get_track(self, username):
+        """ Returns the raw check-in rows of a user ordered by timestamp,
+        without wrapping them in models.
+        """
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+
+        return list(client.execute(self._TRACK_QUERY,
+                                   params={'username': username},
+                                   routing_key=username))
+
+    def get_tracks(self, usernames):
+        """ Same as `get_track` for many users, querying them concurrently.
+        Returns:
+            dict of username to rows.
+        """
+        client = current_app.extensions['registry']['CASSANDRA_CLIENT']
+
+        futures = {
+            username: client.execute_async(self._TRACK_QUERY,
+                                           params={'username': username},
+                                           routing_key=username)
+            for username in usernames
+        }
+        return {
+            username: list(future.result())
+            for username, future in futures.iteritems()
+        }
 
 
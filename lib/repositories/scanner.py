@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import Queue
+import threading
+from lib.models.model_helpers import row_to_dict
+
+_logger = logging.getLogger(__name__)
+
+# bounds of the Murmur3Partitioner ring.  No partition hashes to MIN_TOKEN,
+# so (MIN_TOKEN, MAX_TOKEN] covers every row.
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+
+class _RangeDone(object):
+
+    def __init__(self, token_range):
+        self.token_range = token_range
+
+
+class _ScanFailed(object):
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class TokenRangeScanner(object):
+    """ Reads every row of a table by splitting the token ring into ranges
+    and scanning them concurrently.
+
+    Ranges follow the ring of the cluster so each one is owned by a single
+    replica set, and every range query is sent to one of its owners.  Rows
+    are streamed to the caller through a bounded buffer, so a slow consumer
+    slows the scan down rather than piling rows up in memory.
+
+    With a `checkpoint_path`, a range is recorded as done once all of its
+    rows were handed to the caller, and a later scan with the same path
+    skips recorded ranges.  Ranges interrupted half way are scanned again,
+    so resumed scans see some rows twice.  Changes to the ring between runs
+    change the ranges, in which case everything is scanned again.
+
+    The checkpoint is a log with a line naming the scanned table followed
+    by a line per finished range, each synced to disk as it is appended.
+    A line cut short by a crash is dropped, and a checkpoint of another
+    table is refused.
+    """
+
+    def __init__(self, client, table, partition_key, model,
+                 splits_per_range=4, parallelism=8, fetch_size=1000,
+                 buffer_size=10000, checkpoint_path=None):
+        """
+        Arguments:
+            client: Connected `lib.clients.cass.SimpleClient`.
+            table: Table to scan.
+            partition_key: Partition key column(s) of the table, comma
+                separated for composite keys.
+            model: Model class rows are wrapped in.
+            splits_per_range: Ranges each ring range is split into, more
+                ranges give finer grained parallelism and checkpoints.
+            parallelism: Ranges scanned at once.
+            fetch_size: Rows fetched per page.
+            buffer_size: Rows buffered ahead of the caller.
+            checkpoint_path: File recording the finished ranges.
+        """
+        self.client = client
+        self.table = table
+        self.partition_key = partition_key
+        self.model = model
+        self.splits_per_range = splits_per_range
+        self.parallelism = parallelism
+        self.fetch_size = fetch_size
+        self.buffer_size = buffer_size
+        self.checkpoint_path = checkpoint_path
+
+    def _ring(self):
+        """ Returns the sorted tokens of the ring, or an empty list if the
+        driver has no token metadata.
+        """
+        token_map = self.client.session.cluster.metadata.token_map
+        if not token_map or not token_map.ring:
+            return []
+        return sorted(token_map.ring, key=lambda token: token.value)
+
+    def _replicas(self, token):
+        metadata = self.client.session.cluster.metadata
+        return metadata.token_map.get_replicas(
+            self.client.session.keyspace, token)
+
+    def _split(self, start, end):
+        """ Splits (start, end] into `splits_per_range` adjacent ranges. """
+        step = max((end - start) // self.splits_per_range, 1)
+        bounds = range(start, end, step)[:self.splits_per_range] + [end]
+        return zip(bounds[:-1], bounds[1:])
+
+    def ranges(self):
+        """ Returns (start, end, owner token) tuples covering the whole ring,
+        where start is exclusive and end inclusive.  The owner token is None
+        when the ring is unknown.
+        """
+        ring = self._ring()
+        if not ring:
+            return [(start, end, None)
+                    for start, end in self._split(MIN_TOKEN, MAX_TOKEN)]
+
+        ranges = []
+        previous = MIN_TOKEN
+        for token in ring:
+            for start, end in self._split(previous, token.value):
+                ranges.append((start, end, token))
+            previous = token.value
+
+        # the stretch past the last token wraps around to the first one
+        for start, end in self._split(previous, MAX_TOKEN):
+            ranges.append((start, end, ring[0]))
+
+        return ranges
+
+    def _checkpoint_header(self):
+        return {
+            'keyspace': self.client.session.keyspace,
+            'table': self.table,
+            'partition_key': self.partition_key,
+        }
+
+    def _load_checkpoint(self):
+        """ Returns the ranges recorded as finished and the length of the
+        checkpoint up to the end of its last complete line.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return set(), 0
+        with open(self.checkpoint_path, 'rb') as f:
+            # whatever follows the last newline was never fully written
+            lines = f.read().split('\n')[:-1]
+        if not lines:
+            return set(), 0
+
+        header = json.loads(lines[0])
+        if header != self._checkpoint_header():
+            raise Exception(
+                "Checkpoint %s belongs to a scan of %s.%s" % (
+                    self.checkpoint_path, header.get('keyspace'),
+                    header.get('table')))
+
+        completed = set(tuple(json.loads(line)) for line in lines[1:])
+        return completed, sum(len(line) + 1 for line in lines)
+
+    def _open_checkpoint(self, length):
+        """ Opens the checkpoint for appending after its first `length`
+        bytes, writing the header into an empty one.
+        """
+        f = open(self.checkpoint_path, 'a+b')
+        f.truncate(length)
+        if not length:
+            self._append_checkpoint(f, self._checkpoint_header())
+        return f
+
+    @staticmethod
+    def _append_checkpoint(f, record):
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _scan_range(self, start, end, owner):
+        query = """
+            SELECT * FROM %(table)s
+            WHERE token(%(key)s) > ? AND token(%(key)s) <= ?
+        """ % {'table': self.table, 'key': self.partition_key}
+
+        host = None
+        if owner is not None:
+            replicas = [h for h in self._replicas(owner) if h.is_up]
+            host = replicas[0] if replicas else None
+
+        return self.client.execute(query, params=(start, end),
+                                   use_prepared=True, host=host,
+                                   fetch_size=self.fetch_size)
+
+    def _worker(self, pending, buffered, stopped):
+        while not stopped.is_set():
+            try:
+                start, end, owner = pending.get_nowait()
+            except Queue.Empty:
+                return
+
+            try:
+                for row in self._scan_range(start, end, owner):
+                    if not self._put(buffered, row, stopped):
+                        return
+                self._put(buffered, _RangeDone((start, end)), stopped)
+            except Exception as e:
+                _logger.exception('scanning range (%s, %s] failed',
+                                  start, end)
+                self._put(buffered, _ScanFailed(e), stopped)
+                return
+
+    @staticmethod
+    def _put(buffered, item, stopped):
+        while not stopped.is_set():
+            try:
+                buffered.put(item, timeout=1)
+                return True
+            except Queue.Full:
+                continue
+        return False
+
+    def scan(self):
+        """ Yields a model for every row of the table, in no particular
+        order.  Raises the first error any of the range scans ran into.
+        """
+        completed = set()
+        checkpoint = None
+        if self.checkpoint_path:
+            completed, length = self._load_checkpoint()
+            checkpoint = self._open_checkpoint(length)
+
+        pending = Queue.Queue()
+        for start, end, owner in self.ranges():
+            if (start, end) not in completed:
+                pending.put((start, end, owner))
+        remaining = pending.qsize()
+
+        buffered = Queue.Queue(maxsize=self.buffer_size)
+        stopped = threading.Event()
+        threads = []
+        try:
+            for i in xrange(min(self.parallelism, remaining)):
+                thread = threading.Thread(
+                    target=self._worker, args=(pending, buffered, stopped),
+                    name='token-range-scanner-%d' % i)
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+            while remaining:
+                item = buffered.get()
+                if isinstance(item, _ScanFailed):
+                    raise item.exc
+                if isinstance(item, _RangeDone):
+                    remaining -= 1
+                    if checkpoint:
+                        self._append_checkpoint(
+                            checkpoint, list(item.token_range))
+                    continue
+                yield self.model.from_row(row_to_dict(item))
+        finally:
+            # also reached when the caller stops iterating early
+            stopped.set()
+            for thread in threads:
+                thread.join()
+            if checkpoint:
+                checkpoint.close()
@@ -0,0 +1,169 @@
+from collections import namedtuple
+from datetime import datetime
+import json
+import unittest
+from cassandra.util import OrderedMap
+from lib.models.base_model import (
+    JsonDataField, JsonSerializableBase, JsonWrappedClassField, MapField,
+    Model, SetField, StringField)
+from lib.models.model_helpers import row_to_dict
+
+
+class Settings(JsonSerializableBase):
+
+    def __init__(self, data):
+        self.data = data
+
+    def to_json(self):
+        return json.dumps(self.data, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, value):
+        return cls(json.loads(value))
+
+
+class Profile(Model):
+    name = StringField()
+    extra = JsonDataField()
+    settings = JsonWrappedClassField(wrapper_cls=Settings)
+    visits = MapField()
+    tags = SetField()
+
+
+def _row(**values):
+    row = {
+        'name': u'jeff',
+        'extra': u'{"home": "Boston", "likes": ["tea"]}',
+        'settings': u'{"theme": "dark"}',
+        'visits': OrderedMap([(u'Boston', 3)]),
+        'tags': set([u'a']),
+    }
+    row.update(values)
+    return row
+
+
+class LazyDecodeTest(unittest.TestCase):
+
+    def test_from_row_decodes_on_first_read(self):
+        profile = Profile.from_row(_row(extra=u'not json'))
+
+        self.assertEqual(profile.name, u'jeff')
+        self.assertRaises(ValueError, getattr, profile, 'extra')
+
+    def test_failed_decode_keeps_the_column(self):
+        row = _row(extra=u'not json')
+        profile = Profile.from_row(row)
+
+        self.assertRaises(ValueError, getattr, profile, 'extra')
+        self.assertRaises(ValueError, getattr, profile, 'extra')
+        self.assertIs(profile.serialize()['extra'], row['extra'])
+        self.assertEqual(profile.dirty_fields(), set())
+
+    def test_untouched_columns_serialize_as_read(self):
+        row = _row()
+        serialized = Profile.from_row(row).serialize()
+
+        self.assertIs(serialized['extra'], row['extra'])
+        self.assertIs(serialized['settings'], row['settings'])
+        self.assertEqual(serialized['visits'], {u'Boston': 3})
+
+    def test_decoded_values(self):
+        profile = Profile.from_row(_row())
+
+        self.assertEqual(profile.extra['home'], u'Boston')
+        self.assertEqual(profile.settings.data, {u'theme': u'dark'})
+        self.assertEqual(profile.visits, {u'Boston': 3})
+        self.assertNotIsInstance(profile.visits, OrderedMap)
+
+    def test_assigned_values_are_validated_right_away(self):
+        self.assertRaises(ValueError, Profile, {'extra': 'not json'})
+        self.assertRaises(Exception, Profile, {'extra': '5'})
+        self.assertRaises(ValueError, Profile, {'settings': 'not json'})
+
+        profile = Profile.from_row(_row())
+        with self.assertRaises(ValueError):
+            profile.extra = 'not json'
+
+    def test_assigned_strings_are_decoded(self):
+        profile = Profile({'extra': '{"a": 1}', 'settings': '{"b": 2}',
+                           'visits': OrderedMap([('c', 3)])})
+
+        self.assertEqual(profile.extra, {'a': 1})
+        self.assertEqual(profile.settings.data, {'b': 2})
+        self.assertEqual(profile.visits, {'c': 3})
+
+    def test_unknown_attributes(self):
+        self.assertRaises(Exception, Profile.from_row, _row(age=3))
+        self.assertRaises(Exception, Profile, {'age': 3})
+
+
+class DirtyFieldsTest(unittest.TestCase):
+
+    def test_new_models_are_dirty(self):
+        profile = Profile({'name': u'jeff'})
+
+        self.assertEqual(profile.dirty_fields(), set(profile.attributes))
+
+    def test_loaded_models_are_clean(self):
+        profile = Profile.from_row(_row())
+        profile.extra, profile.settings, profile.visits, profile.tags
+
+        self.assertEqual(profile.dirty_fields(), set())
+        self.assertEqual(profile.serialize(dirty_only=True), {})
+
+    def test_assignment(self):
+        profile = Profile.from_row(_row())
+        profile.name = u'jim'
+
+        self.assertEqual(profile.dirty_fields(), set(['name']))
+        self.assertEqual(profile.serialize(dirty_only=True),
+                         {'name': u'jim'})
+
+    def test_in_place_changes(self):
+        profile = Profile.from_row(_row())
+        profile.extra['likes'].append(u'coffee')
+        profile.settings.data['theme'] = u'light'
+        profile.visits[u'Boston'] += 1
+        profile.tags.add(u'b')
+
+        self.assertEqual(profile.dirty_fields(),
+                         set(['extra', 'settings', 'visits', 'tags']))
+
+        serialized = profile.serialize(dirty_only=True)
+        self.assertEqual(json.loads(serialized['extra'])['likes'],
+                         [u'tea', u'coffee'])
+        self.assertEqual(serialized['settings'], '{"theme": "light"}')
+        self.assertEqual(serialized['visits'], {u'Boston': 4})
+        self.assertEqual(serialized['tags'], set([u'a', u'b']))
+
+    def test_reformatted_json_is_not_a_change(self):
+        profile = Profile.from_row(_row(extra=u'{ "home" :"Boston" }'))
+        profile.extra
+
+        self.assertEqual(profile.dirty_fields(), set())
+
+    def test_mark_clean(self):
+        profile = Profile.from_row(_row())
+        profile.extra['home'] = u'Paris'
+        profile.mark_clean()
+
+        self.assertEqual(profile.dirty_fields(), set())
+
+        # values handed out before are still watched
+        profile.extra['home'] = u'Rome'
+        self.assertEqual(profile.dirty_fields(), set(['extra']))
+
+
+class RowToDictTest(unittest.TestCase):
+
+    def test_maps_are_left_to_the_field(self):
+        Row = namedtuple('Row', ['name', 'visits'])
+        visited = datetime(2016, 1, 1)
+        data = row_to_dict(Row(u'jeff', OrderedMap([(u'Boston', visited)])))
+
+        self.assertIsInstance(data['visits'], OrderedMap)
+
+        profile = Profile.from_row(data)
+        self.assertEqual(profile.visits[u'Boston'].replace(tzinfo=None),
+                         visited)
+        self.assertIsNotNone(profile.visits[u'Boston'].tzinfo)
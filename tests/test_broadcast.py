@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from lib.broadcast import Broadcaster
+from lib.event_log import EventLog, EventRelay
+
+
+def _drain(subscription):
+    events = []
+    event = subscription.get(timeout=0)
+    while event is not None:
+        events.append(event)
+        event = subscription.get(timeout=0)
+    return events
+
+
+class BroadcasterTest(unittest.TestCase):
+
+    def test_events_reach_matching_subscribers(self):
+        broadcaster = Broadcaster()
+        jeff = broadcaster.subscribe('jeff')
+        everyone = broadcaster.subscribe()
+
+        broadcaster.publish('jeff', 'a', 1)
+        broadcaster.publish('jim', 'b', 2)
+
+        self.assertEqual(_drain(jeff), [(1, 'a')])
+        self.assertEqual(_drain(everyone), [(1, 'a'), (2, 'b')])
+
+    def test_reconnect_replays_missed_events(self):
+        broadcaster = Broadcaster()
+        for event_id in xrange(1, 6):
+            broadcaster.publish('jeff' if event_id % 2 else 'jim',
+                                'event %d' % event_id, event_id)
+
+        everyone = broadcaster.subscribe(last_id=3)
+        jeff = broadcaster.subscribe('jeff', last_id=1)
+        broadcaster.publish('jeff', 'event 6', 6)
+
+        self.assertEqual(_drain(everyone),
+                         [(4, 'event 4'), (5, 'event 5'), (6, 'event 6')])
+        self.assertEqual(_drain(jeff),
+                         [(3, 'event 3'), (5, 'event 5'), (6, 'event 6')])
+        self.assertFalse(everyone.gap)
+
+    def test_events_gone_from_the_history_are_a_gap(self):
+        broadcaster = Broadcaster(history=3)
+        for event_id in xrange(1, 6):
+            broadcaster.publish('jeff', 'event', event_id)
+
+        self.assertTrue(broadcaster.subscribe(last_id=1).gap)
+        self.assertFalse(broadcaster.subscribe(last_id=2).gap)
+
+    def test_more_missed_events_than_fit_are_a_gap(self):
+        broadcaster = Broadcaster(maxsize=2)
+        for event_id in xrange(1, 4):
+            broadcaster.publish('jeff', 'event', event_id)
+
+        subscription = broadcaster.subscribe(last_id=0)
+        self.assertTrue(subscription.gap)
+        self.assertEqual(_drain(subscription), [])
+
+    def test_slow_subscribers_are_dropped(self):
+        broadcaster = Broadcaster(maxsize=2)
+        subscription = broadcaster.subscribe()
+        for event_id in xrange(1, 4):
+            broadcaster.publish('jeff', 'event', event_id)
+
+        self.assertTrue(subscription.dropped)
+        self.assertEqual(broadcaster.stats()['subscribers'], 0)
+        self.assertEqual(broadcaster.stats()['dropped'], 1)
+
+
+class EventRelayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = EventLog(os.path.join(self.directory, 'events.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_relay_publishes_appended_events(self):
+        broadcaster = Broadcaster()
+        relay = EventRelay(self.log, broadcaster, poll_interval=0.01)
+        relay.start()
+        try:
+            subscription = broadcaster.subscribe('jeff')
+            event_id = self.log.append('jeff', '{}')
+
+            self.assertEqual(subscription.get(timeout=5), (event_id, '{}'))
+        finally:
+            relay.stop()
+
+    def test_start_fills_the_history(self):
+        for _ in xrange(5):
+            self.log.append('jeff', '{}')
+        broadcaster = Broadcaster(history=3)
+        EventRelay(self.log, broadcaster).start()
+
+        self.assertEqual([event_id for event_id, _ in
+                          _drain(broadcaster.subscribe(last_id=2))],
+                         [3, 4, 5])
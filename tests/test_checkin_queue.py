@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from lib.checkin_queue import (
+    CheckinQueue, STATUS_DONE, STATUS_FAILED, STATUS_PENDING)
+
+
+class CheckinQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue = CheckinQueue(os.path.join(self.directory, 'q.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_claims_in_order(self):
+        first = self.queue.enqueue({'username': 'a'})
+        second = self.queue.enqueue({'username': 'b'})
+
+        self.assertEqual(self.queue.claim(), (first, {'username': 'a'}, 1))
+        self.assertEqual(self.queue.claim()[0], second)
+        self.assertIsNone(self.queue.claim())
+
+    def test_complete_and_fail(self):
+        done = self.queue.enqueue({})
+        failed = self.queue.enqueue({})
+        self.queue.claim()
+        self.queue.claim()
+        self.queue.complete(done)
+        self.queue.fail(failed, 'could not save the check-in')
+
+        self.assertEqual(self.queue.get(done)['status'], STATUS_DONE)
+        self.assertEqual(self.queue.get(failed)['status'], STATUS_FAILED)
+        self.assertEqual(self.queue.get(failed)['error'],
+                         'could not save the check-in')
+        self.assertIsNone(self.queue.claim())
+        self.assertIsNone(self.queue.get('unknown'))
+
+    def test_retry(self):
+        checkin_id = self.queue.enqueue({})
+        self.queue.claim()
+        self.queue.retry(checkin_id, 'failed', delay=60)
+
+        self.assertIsNone(self.queue.claim())
+        self.assertEqual(self.queue.get(checkin_id)['status'],
+                         STATUS_PENDING)
+
+        self.queue.retry(checkin_id, 'failed', delay=0)
+        self.assertEqual(self.queue.claim()[2], 2)
+
+    def test_uncounted_retries_keep_the_attempts(self):
+        checkin_id = self.queue.enqueue({})
+        for _ in xrange(3):
+            self.assertEqual(self.queue.claim()[2], 1)
+            self.queue.retry(checkin_id, 'unavailable', delay=0,
+                             count_attempt=False)
+
+    def test_unfinished_claims_are_handed_out_again(self):
+        self.queue.visibility_timeout = 0
+        checkin_id = self.queue.enqueue({})
+        self.queue.claim()
+        time.sleep(0.01)
+
+        self.assertEqual(self.queue.claim(), (checkin_id, {}, 2))
+
+    def test_stats(self):
+        self.queue.enqueue({})
+        done = self.queue.enqueue({})
+        self.queue.claim()
+        self.queue.claim()
+        self.queue.complete(done)
+
+        stats = self.queue.stats()
+        self.assertEqual(stats['depth']['processing'], 1)
+        self.assertEqual(stats['depth']['done'], 1)
+        self.assertEqual(stats['lag']['count'], 1)
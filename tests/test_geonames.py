@@ -0,0 +1,134 @@
+import unittest
+from lib.clients.geonames import GeoNamesClient
+from lib.errors import GeocodingUnavailable
+
+
+def _place(geoname_id, name, **names):
+    place = {'geonameId': geoname_id, 'name': name, 'lat': '1.5',
+             'lng': '2.5'}
+    place.update(names)
+    return place
+
+
+BOSTON = _place(1, u'Boston')
+BOSSIER = _place(2, u'Bossier City')
+BOTOSANI = _place(3, u'Botosani')
+ZURICH = _place(4, u'Z\xfcrich', asciiName=u'Zurich')
+
+
+class FakeGeoNamesClient(GeoNamesClient):
+    """ Answers requests from canned responses instead of GeoNames. """
+
+    def __init__(self, responses):
+        super(FakeGeoNamesClient, self).__init__('secret')
+        self.responses = responses
+        self.requests = []
+
+    def _request(self, priority, **params):
+        self.requests.append(params['name_startsWith'])
+        response = self.responses.get(params['name_startsWith'])
+        if response is None:
+            raise GeocodingUnavailable('GeoNames quota exhausted')
+        return response
+
+
+def _names(suggestions):
+    return [s['name'] for s in suggestions]
+
+
+class SuggestTest(unittest.TestCase):
+
+    def test_cached_lookups(self):
+        client = FakeGeoNamesClient({
+            'bo': {'geonames': [BOSTON], 'totalResultsCount': 1}})
+
+        client.suggest('Bo', 'relevance')
+        client.suggest('bo ', 'relevance')
+
+        self.assertEqual(client.requests, ['bo'])
+
+    def test_exhaustive_results_answer_longer_prefixes(self):
+        client = FakeGeoNamesClient({
+            'bo': {'geonames': [BOSTON, BOSSIER, BOTOSANI],
+                   'totalResultsCount': 3}})
+        client.suggest('bo', 'relevance')
+
+        self.assertEqual(_names(client.suggest('bos', 'relevance')),
+                         [u'Boston', u'Bossier City'])
+        self.assertEqual(_names(client.suggest('bost', 'relevance')),
+                         [u'Boston'])
+        self.assertEqual(client.requests, ['bo'])
+
+    def test_truncated_results_go_upstream(self):
+        client = FakeGeoNamesClient({
+            'bo': {'geonames': [BOSTON], 'totalResultsCount': 300},
+            'bos': {'geonames': [BOSTON], 'totalResultsCount': 20}})
+        client.suggest('bo', 'relevance')
+        client.suggest('bos', 'relevance')
+
+        self.assertEqual(client.requests, ['bo', 'bos'])
+
+    def test_missing_count_is_not_exhaustive(self):
+        client = FakeGeoNamesClient({
+            'bo': {'geonames': [BOSTON]},
+            'bos': {'geonames': [BOSTON]}})
+        client.suggest('bo', 'relevance')
+        client.suggest('bos', 'relevance')
+
+        self.assertEqual(client.requests, ['bo', 'bos'])
+
+    def test_alternate_name_matches_go_upstream(self):
+        client = FakeGeoNamesClient({
+            'z': {'geonames': [ZURICH], 'totalResultsCount': 1},
+            'zu': {'geonames': [], 'totalResultsCount': 0}})
+        client.suggest('z', 'relevance')
+
+        self.assertEqual(client.suggest('zu', 'relevance'), [])
+        self.assertEqual(client.requests, ['z', 'zu'])
+
+    def test_orderings_are_cached_apart(self):
+        client = FakeGeoNamesClient({
+            'bo': {'geonames': [BOSTON], 'totalResultsCount': 1}})
+        client.suggest('bo', 'relevance')
+        client.suggest('bo', 'population')
+
+        self.assertEqual(client.requests, ['bo', 'bo'])
+
+    def test_degraded_lookups_narrow_whatever_is_cached(self):
+        client = FakeGeoNamesClient({
+            'bo': {'geonames': [BOSTON, BOSSIER, ZURICH],
+                   'totalResultsCount': 300}})
+        client.suggest('bo', 'relevance')
+
+        self.assertEqual(_names(client.suggest('bost', 'relevance')),
+                         [u'Boston'])
+        self.assertEqual(client.suggest('paris', 'relevance'), [])
+
+
+class SuggestionTokenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeGeoNamesClient({
+            'z': {'geonames': [ZURICH], 'totalResultsCount': 1}})
+        self.token = self.client.suggest('z', 'relevance')[0]['token']
+
+    def test_resolves_in_any_client_with_the_secret(self):
+        place = FakeGeoNamesClient({}).resolve_suggestion(
+            self.token, u'z\xfcrich ')
+
+        self.assertEqual(place,
+                         {'name': u'Z\xfcrich', 'lat': '1.5', 'lng': '2.5'})
+
+    def test_rejects_edited_names(self):
+        self.assertIsNone(
+            self.client.resolve_suggestion(self.token, u'Zug'))
+
+    def test_rejects_forged_tokens(self):
+        other = GeoNamesClient('other secret')
+        payload, _, signature = self.token.partition('.')
+
+        self.assertIsNone(other.resolve_suggestion(self.token))
+        self.assertIsNone(self.client.resolve_suggestion(
+            payload[:-2] + '.' + signature))
+        self.assertIsNone(self.client.resolve_suggestion('garbage'))
+        self.assertIsNone(self.client.resolve_suggestion(None))
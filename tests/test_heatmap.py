@@ -0,0 +1,61 @@
+import unittest
+from lib.analytics.heatmap import MAX_ZOOM, aggregate, bin_coordinates
+
+# (description, latitude, longitude, zoom, expected tile x and y), checked
+# against the slippy map tile numbering of OpenStreetMap
+TILES = [
+    ('whole world', 40.7128, -74.0060, 0, (0, 0)),
+    ('null island', 0, 0, 1, (1, 1)),
+    ('london', 51.5074, -0.1278, 10, (511, 340)),
+    ('new york', 40.7128, -74.0060, 12, (1205, 1540)),
+    ('sydney', -33.8688, 151.2093, 8, (235, 153)),
+    ('north pole', 90, 0, 3, (4, 0)),
+    ('south pole', -90, 0, 3, (4, 7)),
+    ('antimeridian', 0, 180, 2, (3, 2)),
+    ('west edge', 0, -180, 2, (0, 2)),
+]
+
+
+class BinCoordinatesTest(unittest.TestCase):
+
+    def test_tiles(self):
+        for description, latitude, longitude, zoom, expected in TILES:
+            x, y, _ = bin_coordinates([latitude], [longitude], zoom)
+            self.assertEqual((x[0], y[0]), expected, description)
+
+    def test_tiles_of_many_coordinates(self):
+        latitudes = [latitude for _, latitude, _, _, _ in TILES]
+        longitudes = [longitude for _, _, longitude, _, _ in TILES]
+        x, y, _ = bin_coordinates(latitudes, longitudes, 12)
+
+        for i, (description, latitude, longitude, _, _) in enumerate(TILES):
+            single_x, single_y, _ = bin_coordinates(
+                [latitude], [longitude], 12)
+            self.assertEqual((x[i], y[i]), (single_x[0], single_y[0]),
+                             description)
+
+    def test_bins(self):
+        # the center of the world is the top left corner of the bottom
+        # right quarter of the single zoom 0 tile
+        _, _, b = bin_coordinates([0], [0], 0, bins=32)
+        self.assertEqual(b[0], 16 * 32 + 16)
+
+        _, _, b = bin_coordinates([0], [0], 1, bins=32)
+        self.assertEqual(b[0], 0)
+
+        # bins count rows from the top and columns from the left
+        _, _, b = bin_coordinates([-90], [180], 0, bins=4)
+        self.assertEqual(b[0], 15)
+
+
+class AggregateTest(unittest.TestCase):
+
+    def test_counts_are_summed_per_bin(self):
+        tiles = aggregate([51.5074, 51.5074, -33.8688, float('nan')],
+                          [-0.1278, -0.1278, 151.2093, 0])
+
+        self.assertEqual(tiles[(0, 0, 0)], {335: 2, 637: 1})
+        self.assertEqual(tiles[(10, 511, 340)].values(), [2])
+        self.assertEqual(
+            sum(sum(counts.itervalues()) for counts in tiles.itervalues()),
+            3 * (MAX_ZOOM + 1))
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from lib.quota import PRIORITY_AUTOCOMPLETE, PRIORITY_CHECKIN, QuotaLimiter
+
+
+class QuotaLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'quota.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _limiter(self, **kwargs):
+        kwargs.setdefault('hourly_limit', 10)
+        kwargs.setdefault('daily_limit', 100)
+        return QuotaLimiter(self.path, **kwargs)
+
+    def test_autocomplete_leaves_the_reserve_to_checkins(self):
+        limiter = self._limiter(reserve=0.2)
+
+        granted = [limiter.acquire(PRIORITY_AUTOCOMPLETE) for _ in xrange(10)]
+        self.assertEqual(granted.count(True), 8)
+        self.assertFalse(granted[-1])
+
+        self.assertTrue(limiter.acquire(PRIORITY_CHECKIN))
+        self.assertTrue(limiter.acquire(PRIORITY_CHECKIN))
+        self.assertFalse(limiter.acquire(PRIORITY_CHECKIN))
+
+    def test_smallest_bucket_wins(self):
+        limiter = self._limiter(hourly_limit=100, daily_limit=3, reserve=0)
+
+        self.assertEqual(
+            [limiter.acquire(PRIORITY_CHECKIN) for _ in xrange(4)],
+            [True, True, True, False])
+
+    def test_refused_calls_spend_nothing(self):
+        limiter = self._limiter(reserve=0)
+
+        self.assertFalse(limiter.acquire(PRIORITY_CHECKIN, cost=11))
+        self.assertAlmostEqual(limiter.remaining()['hourly'], 10, places=2)
+
+    def test_budget_is_shared_through_the_file(self):
+        first = self._limiter(reserve=0)
+        second = self._limiter(reserve=0)
+
+        for _ in xrange(10):
+            self.assertTrue(first.acquire(PRIORITY_CHECKIN))
+        self.assertFalse(second.acquire(PRIORITY_CHECKIN))
+
+    def test_exhaust_empties_every_bucket(self):
+        limiter = self._limiter()
+        limiter.exhaust()
+
+        self.assertFalse(limiter.acquire(PRIORITY_CHECKIN))
+        remaining = limiter.remaining()
+        self.assertLess(remaining['hourly'], 1)
+        self.assertLess(remaining['daily'], 1)
+
+    def test_retry_after(self):
+        limiter = self._limiter(hourly_limit=10, daily_limit=1000,
+                                reserve=0.2)
+        self.assertEqual(limiter.retry_after(PRIORITY_CHECKIN), 0)
+
+        limiter.exhaust()
+        # one credit comes back every 6 minutes of the hourly bucket
+        self.assertAlmostEqual(
+            limiter.retry_after(PRIORITY_CHECKIN), 6 * 60, delta=2)
+        # autocomplete has to wait for the reserve to fill up as well
+        self.assertGreater(limiter.retry_after(PRIORITY_AUTOCOMPLETE),
+                           3 * 6 * 60)
@@ -0,0 +1,189 @@
+from collections import namedtuple
+import os
+import shutil
+import tempfile
+import unittest
+from lib.repositories.scanner import MAX_TOKEN, MIN_TOKEN, TokenRangeScanner
+
+Row = namedtuple('Row', ['token', 'username'])
+
+
+class Token(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Host(object):
+
+    def __init__(self, name, is_up=True):
+        self.name = name
+        self.is_up = is_up
+
+
+class TokenMap(object):
+
+    def __init__(self, ring, replicas):
+        self.ring = ring
+        self.replicas = replicas
+
+    def get_replicas(self, keyspace, token):
+        return self.replicas[token.value]
+
+
+class FakeClient(object):
+    """ Answers token range queries from an in-memory list of rows. """
+
+    def __init__(self, rows, token_map=None, fail_at=None):
+        self.rows = rows
+        self.fail_at = fail_at
+        self.hosts = []
+        metadata = type('Metadata', (), {'token_map': token_map})()
+        cluster = type('Cluster', (), {'metadata': metadata})()
+        self.session = type('Session', (), {
+            'cluster': cluster, 'keyspace': 'dimagi'})()
+
+    def execute(self, query, params, use_prepared, host, fetch_size):
+        start, end = params
+        self.hosts.append(host)
+        if self.fail_at is not None and start < self.fail_at <= end:
+            raise RuntimeError('range unavailable')
+        return [row for row in self.rows if start < row.token <= end]
+
+
+class Model(object):
+
+    @classmethod
+    def from_row(cls, data):
+        return data['username']
+
+
+def _rows(count):
+    step = (MAX_TOKEN - MIN_TOKEN) // count
+    return [Row(MIN_TOKEN + 1 + i * step, 'user%d' % i)
+            for i in xrange(count)]
+
+
+class TokenRangeScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.directory, 'scan.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _ring(self):
+        tokens = [Token(-2 ** 62), Token(0), Token(2 ** 62)]
+        replicas = {
+            token.value: [Host('down', is_up=False), Host(token.value)]
+            for token in tokens
+        }
+        return TokenMap(tokens, replicas)
+
+    def _scanner(self, client, **kwargs):
+        return TokenRangeScanner(client, 'location', 'username', Model,
+                                 **kwargs)
+
+    def assertCoversRing(self, ranges):
+        bounds = sorted((start, end) for start, end, _ in ranges)
+        self.assertEqual(bounds[0][0], MIN_TOKEN)
+        self.assertEqual(bounds[-1][1], MAX_TOKEN)
+        for (_, end), (start, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, start)
+
+    def test_ranges_follow_the_ring(self):
+        scanner = self._scanner(FakeClient([], self._ring()),
+                                splits_per_range=4)
+        ranges = scanner.ranges()
+
+        self.assertEqual(len(ranges), 16)
+        self.assertCoversRing(ranges)
+        for start, end, owner in ranges:
+            if end <= 2 ** 62:
+                # a token owns the stretch of the ring leading up to it
+                self.assertTrue(start < end <= owner.value)
+            else:
+                self.assertEqual(owner.value, -2 ** 62)
+
+    def test_ranges_without_ring(self):
+        scanner = self._scanner(FakeClient([]), splits_per_range=3)
+        ranges = scanner.ranges()
+
+        self.assertEqual(len(ranges), 3)
+        self.assertCoversRing(ranges)
+        self.assertEqual(set(owner for _, _, owner in ranges), set([None]))
+
+    def test_scan_reads_every_row_once_from_a_live_replica(self):
+        rows = _rows(500)
+        client = FakeClient(rows, self._ring())
+        scanned = list(self._scanner(client, parallelism=4).scan())
+
+        self.assertEqual(sorted(scanned), sorted(r.username for r in rows))
+        self.assertTrue(all(host.is_up for host in client.hosts))
+
+    def test_scan_raises_range_failures(self):
+        client = FakeClient(_rows(100), self._ring(), fail_at=1)
+        with self.assertRaises(RuntimeError):
+            list(self._scanner(client).scan())
+
+    def test_finished_scan_is_not_repeated(self):
+        client = FakeClient(_rows(100), self._ring())
+        self.assertEqual(
+            len(list(self._scanner(
+                client, checkpoint_path=self.checkpoint_path).scan())),
+            100)
+
+        client.hosts = []
+        self.assertEqual(list(self._scanner(
+            client, checkpoint_path=self.checkpoint_path).scan()), [])
+        self.assertEqual(client.hosts, [])
+
+    def test_interrupted_scan_resumes(self):
+        rows = _rows(200)
+        client = FakeClient(rows, self._ring())
+        scan = self._scanner(client, parallelism=1, buffer_size=1,
+                             checkpoint_path=self.checkpoint_path).scan()
+        first = [next(scan) for _ in xrange(60)]
+        scan.close()
+
+        rest = list(self._scanner(
+            client, checkpoint_path=self.checkpoint_path).scan())
+
+        self.assertEqual(set(first) | set(rest),
+                         set(r.username for r in rows))
+        # only the range that was cut short is read again
+        self.assertLessEqual(len(rest), len(rows) - 60 + 13)
+
+    def test_cut_short_checkpoint_line_is_dropped(self):
+        client = FakeClient(_rows(100), self._ring())
+        list(self._scanner(client,
+                           checkpoint_path=self.checkpoint_path).scan())
+
+        with open(self.checkpoint_path) as f:
+            lines = f.read().splitlines(True)
+        with open(self.checkpoint_path, 'w') as f:
+            f.writelines(lines[:-1])
+            f.write(lines[-1][:5])
+
+        # only the range whose line was cut short is scanned again
+        client.hosts = []
+        list(self._scanner(client,
+                           checkpoint_path=self.checkpoint_path).scan())
+        self.assertEqual(len(client.hosts), 1)
+
+        client.hosts = []
+        list(self._scanner(client,
+                           checkpoint_path=self.checkpoint_path).scan())
+        self.assertEqual(client.hosts, [])
+
+    def test_checkpoint_of_another_table_is_refused(self):
+        client = FakeClient(_rows(10), self._ring())
+        list(self._scanner(client,
+                           checkpoint_path=self.checkpoint_path).scan())
+
+        scanner = TokenRangeScanner(client, 'location_by_timestamp',
+                                    'username', Model,
+                                    checkpoint_path=self.checkpoint_path)
+        with self.assertRaises(Exception):
+            list(scanner.scan())
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from lib.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def _concurrently(self, flight, fn, callers=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do('key', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in xrange(callers)]
+        threads[0].start()
+        # the others have to find the first call in flight
+        while not flight.in_flight():
+            time.sleep(0.01)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        return threads, results, errors
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait()
+            return 'result'
+
+        threads, results, errors = self._concurrently(flight, fn)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(errors, [])
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait()
+            raise ValueError('upstream failed')
+
+        threads, results, errors = self._concurrently(flight, fn)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_later_calls_run_again(self):
+        flight = SingleFlight()
+        calls = []
+
+        flight.do('key', calls.append, 1)
+        flight.do('key', calls.append, 2)
+
+        self.assertEqual(calls, [1, 2])
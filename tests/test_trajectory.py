@@ -0,0 +1,107 @@
+import unittest
+import numpy as np
+from lib.analytics.trajectory import summarize
+
+# length of a degree of longitude along the equator
+DEGREE_KM = 111.195
+
+HOUR = 3600.0
+
+# (description, check-ins as (seconds, latitude, longitude, name), expected)
+CASES = [
+    ('a single check-in', [
+        (0, 0, 0, u'a'),
+    ], {
+        'checkins': 1,
+        'total_distance_km': 0,
+        'speeds_kmh': [],
+        'max_speed_kmh': None,
+        'dwell_seconds': {},
+        'impossible_travel': False,
+        'impossible_legs': [],
+    }),
+    ('speeds per leg', [
+        (0, 0, 0, u'a'),
+        (HOUR, 0, 1, u'b'),
+        (3 * HOUR, 0, 2, u'c'),
+    ], {
+        'checkins': 3,
+        'total_distance_km': 2 * DEGREE_KM,
+        'speeds_kmh': [DEGREE_KM, DEGREE_KM / 2],
+        'max_speed_kmh': DEGREE_KM,
+        'impossible_travel': False,
+        'impossible_legs': [],
+    }),
+    ('dwell time of repeated places', [
+        (0, 0, 0, u'home'),
+        (HOUR, 0, 0, u'work'),
+        (1.5 * HOUR, 0, 0, u'home'),
+        (4 * HOUR, 0, 0, u'work'),
+    ], {
+        'total_distance_km': 0,
+        'speeds_kmh': [0, 0, 0],
+        'max_speed_kmh': 0,
+        # the latest check-in has no dwell time yet
+        'dwell_seconds': {u'home': 3.5 * HOUR, u'work': 0.5 * HOUR},
+    }),
+    ('impossibly fast leg', [
+        (0, 0, 0, u'a'),
+        (HOUR, 0, 1, u'b'),
+        (2 * HOUR, 0, 11, u'c'),
+    ], {
+        'max_speed_kmh': 10 * DEGREE_KM,
+        'impossible_travel': True,
+        'impossible_legs': [1],
+    }),
+    ('moving without elapsed time', [
+        (0, 0, 0, u'a'),
+        (0, 0, 1, u'b'),
+        (HOUR, 0, 2, u'c'),
+    ], {
+        'speeds_kmh': [None, DEGREE_KM],
+        'max_speed_kmh': DEGREE_KM,
+        'impossible_travel': True,
+        'impossible_legs': [0],
+    }),
+    ('standing still without elapsed time', [
+        (0, 0, 0, u'a'),
+        (0, 0, 0, u'a'),
+    ], {
+        'speeds_kmh': [0],
+        'max_speed_kmh': 0,
+        'impossible_travel': False,
+        'dwell_seconds': {u'a': 0},
+    }),
+]
+
+
+def _arrays(checkins):
+    timestamps, latitudes, longitudes, names = zip(*checkins)
+    return (np.array(timestamps, dtype=np.float64),
+            np.array(latitudes, dtype=np.float64),
+            np.array(longitudes, dtype=np.float64),
+            np.array(names, dtype=np.unicode_))
+
+
+class SummarizeTest(unittest.TestCase):
+
+    def assertClose(self, actual, expected, msg):
+        if isinstance(expected, dict):
+            self.assertEqual(set(actual), set(expected), msg)
+            for key in expected:
+                self.assertClose(actual[key], expected[key], msg)
+        elif isinstance(expected, list):
+            self.assertEqual(len(actual), len(expected), msg)
+            for a, e in zip(actual, expected):
+                self.assertClose(a, e, msg)
+        elif isinstance(expected, float):
+            self.assertAlmostEqual(actual, expected, places=2, msg=msg)
+        else:
+            self.assertEqual(actual, expected, msg)
+
+    def test_cases(self):
+        for description, checkins, expected in CASES:
+            summary = summarize(*_arrays(checkins))
+            for key, value in expected.iteritems():
+                self.assertClose(summary[key], value,
+                                 '%s: %s' % (description, key))